@@ -1,137 +1,330 @@
 # build_db.py
 
-# Импортируем необходимые библиотеки:
-# numpy - для работы с числовыми массивами и математическими операциями
+# Быстрая загрузка MNIST в demo.mnist_samples:
+#   1. idx-файлы из data/MNIST/raw (в т.ч. .gz) разбираются целиком через
+#      numpy.frombuffer — без torchvision и без цикла по примерам;
+#   2. строки уходят в PostgreSQL через COPY ... FROM STDIN (binary) пачками,
+#      буфер пачки собирается одним numpy structured array;
+#   3. каждая пачка — отдельная транзакция, поэтому прерванную загрузку
+#      можно просто запустить снова: split продолжается с уже записанной строки;
+#   4. --jobs 2 грузит train и test параллельно (по соединению на split);
+#   5. vec пишется в компактном формате uint8 (784 байта вместо 3136 у
+#      float32), --migrate переводит в него уже загруженные float32-строки.
+#
+# Запуск (из корня репозитория, utils.* берутся из web-app):
+#   PYTHONPATH=web-app python db/build_mnist_db.py [--jobs 2] [--splits test]
+#   PYTHONPATH=web-app python db/build_mnist_db.py --migrate
+
+import argparse
+import gzip
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# numpy - для работы с числовыми массивами
 import numpy as np
-# datasets - для загрузки стандартных датасетов (включая MNIST)
-# transforms - для преобразований изображений
-from torchvision import datasets, transforms
+from psycopg2.extras import execute_values
 # Импортируем функции для работы с подключением к базе данных
 from utils.db import get_conn, put_conn
+# Индекс случайной выборки для grid (demo.mnist_sample_index)
+from utils.mnist_samples import decode_vec, rebuild_sample_index
 
+# Префиксы idx-файлов для каждого раздела датасета
+SPLIT_PREFIX = {"train": "train", "test": "t10k"}
 
-def ds_to_arrays(ds):
-    """
-    Преобразует датасет PyTorch в массивы numpy.
+# Сколько строк в одном COPY / UPDATE миграции
+CHUNK_ROWS = 5000
+
+# Форматы demo.mnist_samples.vec (колонка dtype, см. db_init.py)
+VEC_DTYPES = {"uint8": "u1", "float32": "<f4"}
+
+# Заголовок binary COPY: сигнатура, флаги, длина расширения заголовка
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x00"
+COPY_TRAILER = b"\xff\xff"
+
+COPY_SQL = (
+    "COPY demo.mnist_samples (split, label, vec, rows, cols, dtype) "
+    "FROM STDIN WITH (FORMAT binary)"
+)
+
+MIGRATE_SQL = """
+    UPDATE demo.mnist_samples m
+    SET vec = v.vec, dtype = 'uint8'
+    FROM (VALUES %s) AS v(id, vec)
+    WHERE m.id = v.id
+"""
 
-    Args:
-        ds: PyTorch Dataset объект (MNIST датасет)
+
+# --------------------------------------------------
+# idx parsing
+# --------------------------------------------------
+# Копия read_idx из ml-api/api/mnist_data.py — источник истины там, правки
+# вносить в обе. db/ работает только с web-app/utils (PYTHONPATH=web-app)
+# и не импортирует код ml-api: это разные развёртывания.
+def read_idx(path):
+    """
+    Разбирает idx-файл (http://yann.lecun.com/exdb/mnist/), в т.ч. gzip.
 
     Returns:
-        tuple: (X, Y) где:
-            X - массив с векторными представлениями изображений формы (n_samples, 784)
-            Y - массив с метками (цифрами от 0 до 9) формы (n_samples,)
+        np.ndarray uint8 формы из заголовка: (N, 28, 28) или (N,)
     """
-    xs, ys = [], []  # Создаем пустые списки для изображений и меток
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rb") as f:
+        data = f.read()
 
-    # Итерируемся по всем элементам датасета
-    for img, y in ds:
-        # img - тензор PyTorch формы (1, 28, 28)
-        # squeeze(0) удаляет первую размерность (1, 28, 28) -> (28, 28)
-        # numpy() преобразует тензор в массив numpy
-        arr = img.squeeze(0).numpy()  # (28,28) в [0..1]
+    # magic: 0, 0, тип (0x08 = uint8), число измерений
+    if data[0] != 0 or data[1] != 0 or data[2] != 0x08:
+        raise ValueError(f"{path} is not a uint8 idx file")
+    ndim = data[3]
+    dims = np.frombuffer(data, dtype=">i4", count=ndim, offset=4)
+    return np.frombuffer(data, dtype=np.uint8, offset=4 + 4 * ndim).reshape(
+        tuple(int(d) for d in dims)
+    )
 
-        # reshape(-1) преобразует 2D массив 28x28 в 1D массив из 784 элементов
-        # -1 означает "автоматически определить размерность"
-        xs.append(arr.reshape(-1))  # (784,)
 
-        # Преобразуем метку в целое число и добавляем в список
-        ys.append(int(y))
+def _find(raw_dir, name):
+    # torchvision оставляет и распакованный файл, и .gz — берём любой
+    for candidate in (raw_dir / name, raw_dir / f"{name}.gz"):
+        if candidate.exists():
+            return candidate
+    return None
 
-    # stack объединяет все массивы в один большой массив
-    # np.array создает массив из списка меток
-    return np.stack(xs), np.array(ys)
 
+def load_split(split, data_dir):
+    """
+    Изображения (N, 28, 28) uint8 и метки (N,) uint8 раздела train/test.
+    Если idx-файлов нет, они один раз скачиваются через torchvision.
+    """
+    raw_dir = Path(data_dir) / "MNIST" / "raw"
+    prefix = SPLIT_PREFIX[split]
+    names = (f"{prefix}-images-idx3-ubyte", f"{prefix}-labels-idx1-ubyte")
 
-# Проверяем, запущен ли скрипт напрямую (а не импортирован как модуль)
-if __name__ == "__main__":
+    if any(_find(raw_dir, name) is None for name in names):
+        # torchvision нужен только как загрузчик сырых файлов
+        from torchvision import datasets
 
-    # Создаем преобразование: преобразует изображение в тензор PyTorch
-    # и нормализует значения пикселей в диапазон [0, 1]
-    to_tensor = transforms.ToTensor()
+        print(f"⬇️ {split}: idx-файлов нет в {raw_dir}, скачиваем")
+        datasets.MNIST(str(data_dir), train=(split == "train"), download=True)
 
-    # Загружаем тренировочный датасет MNIST:
-    # "data" - папка для сохранения данных
-    # train=True - загружаем тренировочную часть
-    # download=True - скачиваем если нет локальной копии
-    # transform=to_tensor - применяем преобразование в тензор
-    train = datasets.MNIST("data", train=True, download=True, transform=to_tensor)
+    images = read_idx(_find(raw_dir, names[0]))
+    labels = read_idx(_find(raw_dir, names[1]))
+    if len(images) != len(labels):
+        raise ValueError(f"{split}: {len(images)} images but {len(labels)} labels")
+    return images, labels
 
-    # Загружаем тестовый датасет MNIST (train=False)
-    test = datasets.MNIST("data", train=False, download=True, transform=to_tensor)
 
-    # Преобразуем датасеты в массивы numpy
-    # Xtr - тренировочные изображения (60000, 784), Ytr - тренировочные метки (60000,)
-    # Xte - тестовые изображения (10000, 784), Yte - тестовые метки (10000,)
-    Xtr, Ytr = ds_to_arrays(train)
-    Xte, Yte = ds_to_arrays(test)
+# --------------------------------------------------
+# Binary COPY
+# --------------------------------------------------
+def copy_rows(split, images, labels, dtype="uint8"):
+    """
+    Буфер binary COPY для строк (split, label, vec, rows, cols, dtype).
+
+    Все поля фиксированной длины, поэтому строка — это одна запись
+    numpy structured dtype (поля big-endian, как требует протокол),
+    а весь буфер заполняется векторно, без цикла по строкам.
+    vec — пиксели как есть (uint8) или float32 [0..1] в нативном
+    порядке байт (как np.tobytes, старый формат).
+    """
+    n, rows, cols = images.shape
+    split_b = split.encode()
+    dtype_b = dtype.encode()
+    vec_dtype = np.dtype(VEC_DTYPES[dtype])
+
+    row_dtype = np.dtype([
+        ("nfields", ">i2"),
+        ("split_len", ">i4"), ("split", f"S{len(split_b)}"),
+        ("label_len", ">i4"), ("label", ">i4"),
+        ("vec_len", ">i4"), ("vec", vec_dtype, (rows * cols,)),
+        ("rows_len", ">i4"), ("rows", ">i4"),
+        ("cols_len", ">i4"), ("cols", ">i4"),
+        ("dtype_len", ">i4"), ("dtype", f"S{len(dtype_b)}"),
+    ])
+    buf = np.empty(n, dtype=row_dtype)
+    buf["nfields"] = 6
+    buf["split_len"] = len(split_b)
+    buf["split"] = split_b
+    buf["label_len"] = 4
+    buf["label"] = labels
+    buf["vec_len"] = rows * cols * vec_dtype.itemsize
+    if dtype == "uint8":
+        buf["vec"] = images.reshape(n, -1)
+    else:
+        # тот же результат, что transforms.ToTensor(): float32(x) / 255
+        buf["vec"] = images.reshape(n, -1).astype(np.float32) / 255
+    buf["rows_len"] = 4
+    buf["rows"] = rows
+    buf["cols_len"] = 4
+    buf["cols"] = cols
+    buf["dtype_len"] = len(dtype_b)
+    buf["dtype"] = dtype_b
+    return COPY_HEADER + buf.tobytes() + COPY_TRAILER
+
+
+def load_split_into_db(split, data_dir, chunk_rows=CHUNK_ROWS, dtype="uint8"):
+    """
+    Догружает раздел split в demo.mnist_samples.
+
+    Строки пишутся в порядке файла, пачка за пачкой, с commit после
+    каждой, поэтому число уже записанных строк раздела — это позиция,
+    с которой продолжается прерванная загрузка.
+
+    Returns:
+        int: сколько строк добавлено
+    """
+    images, labels = load_split(split, data_dir)
+    total = len(labels)
 
-    # Получаем соединение с базой данных из пула
     conn = get_conn()
     try:
-
-        # Создаем курсор для выполнения SQL-запросов
         with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM demo.mnist_samples WHERE split = %s", (split,))
+            done = cur.fetchone()[0]
+            conn.commit()
 
-            # Проверяем, есть ли уже данные в таблице, чтобы избежать дублирования
-            cur.execute("SELECT COUNT(*) FROM demo.mnist_samples")
+            if done > total:
+                raise RuntimeError(
+                    f"{split}: в БД {done} строк, а в idx-файлах только {total}"
+                )
+            if done == total:
+                print(f"ℹ️ {split}: уже загружено {done} строк — пропускаем")
+                return 0
+            if done:
+                print(f"↩️ {split}: продолжаем с строки {done} из {total}")
+
+            started = time.perf_counter()
+            for start in range(done, total, chunk_rows):
+                stop = min(start + chunk_rows, total)
+                payload = copy_rows(split, images[start:stop], labels[start:stop], dtype)
+                cur.copy_expert(COPY_SQL, io.BytesIO(payload))
+                conn.commit()
+                print(f"   {split}: {stop}/{total}")
 
-            # fetchone() возвращает одну строку результата, [0] - первый столбец
-            # Если запрос не вернул строк (rowcount == -1), устанавливаем cnt = 0
-            cnt = cur.fetchone()[0] if cur.rowcount != -1 else 0
+        elapsed = time.perf_counter() - started
+        print(f"✅ {split}: {total - done} строк за {elapsed:.1f} с")
+        return total - done
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Всегда возвращаем соединение в пул, даже если произошла ошибка
+        put_conn(conn)
 
-            # Если таблица пустая (cnt == 0), загружаем данные
-            if cnt == 0:
 
-                # Вложенная функция для вставки данных определенного раздела (train/test)
-                def insert(split, X, Y):
-                    """
-                    Вставляет данные в таблицу mnist_samples.
+# --------------------------------------------------
+# Migration float32 -> uint8
+# --------------------------------------------------
+def migrate_to_uint8(chunk_rows=CHUNK_ROWS):
+    """
+    Переводит строки dtype='float32' в uint8 пачками по id (commit на
+    пачку, прерванную миграцию можно продолжить), затем VACUUM FULL
+    возвращает освободившееся место таблицы и её TOAST.
+
+    Returns:
+        int: сколько строк переведено
+    """
+    conn = get_conn()
+    migrated = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_total_relation_size('demo.mnist_samples')")
+            size_before = cur.fetchone()[0]
 
-                    Args:
-                        split: строка 'train' или 'test'
-                        X: массив изображений формы (n_samples, 784)
-                        Y: массив меток формы (n_samples,)
+            last_id = 0
+            while True:
+                cur.execute(
                     """
-                    rows = []  # Список для хранения кортежей с данными для вставки
-
-                    # Итерируемся по всем изображениям и меткам
-                    for x, y in zip(X, Y):
-                        # Создаем кортеж с данными для одной строки:
-                        rows.append((
-                            split,  # раздел: 'train' или 'test'
-                            int(y),  # метка: цифра от 0 до 9
-
-                            # Преобразуем массив в бинарный формат:
-                            # 1. astype(np.float32) - преобразуем в float32
-                            # 2. tobytes() - преобразуем в байты
-                            # 3. memoryview() - создаем представление памяти для эффективной передачи
-                            memoryview(x.astype(np.float32).tobytes()),
-                            28,  # количество строк в изображении
-                            28  # количество столбцов в изображении
-                        ))
-
-                    # executemany выполняет один SQL запрос для всех строк
-                    # Это эффективнее, чем выполнять отдельный INSERT для каждой строки
-                    cur.executemany(
-                        "INSERT INTO demo.mnist_samples (split,label,vec,rows,cols) VALUES (%s,%s,%s,%s,%s)",
-                        rows  # список кортежей с данными
-                    )
-
-
-                # Вставляем тренировочные данные
-                insert("train", Xtr, Ytr)
-
-                # Вставляем тестовые данные
-                insert("test", Xte, Yte)
-
-                # Фиксируем изменения в базе данных
+                    SELECT id, vec, rows, cols
+                    FROM demo.mnist_samples
+                    WHERE dtype = 'float32' AND id > %s
+                    ORDER BY id
+                    LIMIT %s
+                    """,
+                    (last_id, chunk_rows),
+                )
+                batch = cur.fetchall()
+                if not batch:
+                    break
+                values = [
+                    (sample_id, decode_vec(vec, rows, cols, "float32").tobytes())
+                    for sample_id, vec, rows, cols in batch
+                ]
+                execute_values(cur, MIGRATE_SQL, values, template="(%s, %s::bytea)", page_size=len(values))
                 conn.commit()
-                print("✅ Данные MNIST загружены в PostgreSQL")
-            else:
-                # Если данные уже есть, выводим информационное сообщение
-                print(f"ℹ️ Уже есть {cnt} строк — пропускаем загрузку")
+                migrated += len(batch)
+                last_id = batch[-1][0]
+                print(f"   {migrated} строк переведено")
+            conn.commit()
 
+        if migrated:
+            # VACUUM не выполняется внутри транзакции
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("VACUUM FULL demo.mnist_samples")
+                    cur.execute("SELECT pg_total_relation_size('demo.mnist_samples')")
+                    size_after = cur.fetchone()[0]
+            finally:
+                conn.autocommit = False
+            print(
+                f"✅ {migrated} строк переведено в uint8, размер таблицы "
+                f"{size_before / 2**20:.1f} → {size_after / 2**20:.1f} МБ"
+            )
+        else:
+            print("ℹ️ float32-строк нет — миграция не нужна")
+        return migrated
+    except Exception:
+        conn.rollback()
+        raise
     finally:
-        # Всегда возвращаем соединение в пул, даже если произошла ошибка
         put_conn(conn)
+
+
+# --------------------------------------------------
+# Entry point
+# --------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Load MNIST into demo.mnist_samples")
+    parser.add_argument("--data-dir", default="data", help="root with MNIST/raw idx files")
+    parser.add_argument("--splits", nargs="+", default=["train", "test"], choices=sorted(SPLIT_PREFIX))
+    parser.add_argument("--jobs", type=int, default=1, help="splits loaded in parallel")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--dtype", default="uint8", choices=sorted(VEC_DTYPES),
+                        help="storage format of new rows")
+    parser.add_argument("--migrate", action="store_true",
+                        help="convert existing float32 rows to uint8 and exit")
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate_to_uint8(args.chunk_rows)
+        return
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        added = sum(pool.map(
+            lambda split: load_split_into_db(split, args.data_dir, args.chunk_rows, args.dtype),
+            args.splits,
+        ))
+
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            # Индекс выборки должен покрывать все строки mnist_samples;
+            # перестраиваем его после загрузки и для старых баз без него
+            cur.execute("SELECT COUNT(*) FROM demo.mnist_samples")
+            cnt = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM demo.mnist_sample_index")
+            if added or cur.fetchone()[0] != cnt:
+                rebuild_sample_index(cur)
+                print("✅ Индекс выборки demo.mnist_sample_index перестроен")
+        conn.commit()
+    finally:
+        put_conn(conn)
+
+    print(f"✅ Данные MNIST загружены в PostgreSQL ({cnt} строк, {time.perf_counter() - started:.1f} с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -146,10 +146,50 @@ DDL_STATEMENTS = [
     );
     """,
 
+    # -- формат vec: 'float32' (784 x float32 в [0..1], 3136 байт — старые
+    # -- строки) или 'uint8' (784 байта, как в исходных idx-файлах);
+    # -- перевод старых строк: build_mnist_db.py --migrate
+    """
+    ALTER TABLE demo.mnist_samples
+    ADD COLUMN IF NOT EXISTS dtype TEXT NOT NULL DEFAULT 'float32'
+        CHECK (dtype IN ('float32', 'uint8'));
+    """,
+
     """
     CREATE INDEX IF NOT EXISTS idx_mnist_split_label
     ON demo.mnist_samples (split, label);
     """,
+
+    # -- плотные случайные позиции 0..n-1 на (split, label) для выборки
+    # -- без ORDER BY random(); заполняется build_mnist_db.py
+    """
+    CREATE TABLE IF NOT EXISTS demo.mnist_sample_index (
+        split TEXT NOT NULL,
+        label INTEGER NOT NULL,
+        pos INTEGER NOT NULL,
+        sample_id BIGINT NOT NULL REFERENCES demo.mnist_samples(id) ON DELETE CASCADE,
+        PRIMARY KEY (split, label, pos)
+    );
+    """,
+
+    # -- предрасчитанные предсказания по всему датасету для версии модели
+    # -- (db/score_mnist.py); grid берёт ответ отсюда вместо live-инференса
+    """
+    CREATE TABLE IF NOT EXISTS ml.mnist_predictions (
+        sample_id BIGINT NOT NULL REFERENCES demo.mnist_samples(id) ON DELETE CASCADE,
+        model_version TEXT NOT NULL,
+        predicted_label INTEGER NOT NULL,
+        confidence DOUBLE PRECISION NOT NULL,
+        probabilities REAL[] NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (sample_id, model_version)
+    );
+    """,
+
+    """
+    CREATE INDEX IF NOT EXISTS idx_ml_mnist_predictions_version
+    ON ml.mnist_predictions (model_version);
+    """,
 ]
 
 
@@ -0,0 +1,183 @@
+# score_mnist.py
+
+# Предрасчёт предсказаний модели для всего demo.mnist_samples:
+#   - примеры читаются серверным курсором и уходят в ml-api пачками
+#     (POST /mnist/predict_batch?version=...&cache=false, до
+#     PREDICT_BATCH_MAX_IMAGES): прогон не вытесняет из кэша API
+#     интерактивные запросы;
+#   - несколько запросов держатся в полёте одновременно (--jobs);
+#   - ответы пишутся в ml.mnist_predictions с commit на пачку, поэтому
+#     прерванный прогон продолжается с ещё не посчитанных строк;
+#   - в конце печатается accuracy версии по каждому split.
+#
+# Запуск (из корня репозитория, utils.* берутся из web-app):
+#   PYTHONPATH=web-app python db/score_mnist.py [--version v2] [--splits test]
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import execute_values
+
+from utils.db import get_conn, put_conn
+from utils.inference_client import client
+from utils.mnist_samples import decode_vec
+
+# Должен совпадать с PREDICT_BATCH_MAX_IMAGES ml-api: больше — 422 на пачку
+PREDICT_BATCH_MAX_IMAGES = int(os.getenv("PREDICT_BATCH_MAX_IMAGES", "512"))
+BATCH_SIZE = PREDICT_BATCH_MAX_IMAGES
+# Целая пачка большая: бюджет на запрос шире, чем у интерактивных вызовов
+BATCH_TIMEOUT_S = 60.0
+
+SELECT_SQL = """
+    SELECT s.id, s.vec, s.rows, s.cols, s.dtype
+    FROM demo.mnist_samples s
+    WHERE s.split = ANY(%(splits)s)
+      AND (%(force)s OR NOT EXISTS (
+          SELECT 1 FROM ml.mnist_predictions p
+          WHERE p.sample_id = s.id AND p.model_version = %(version)s
+      ))
+    ORDER BY s.id
+"""
+
+UPSERT_SQL = """
+    INSERT INTO ml.mnist_predictions (
+        sample_id, model_version, predicted_label, confidence, probabilities
+    )
+    VALUES %s
+    ON CONFLICT (sample_id, model_version) DO UPDATE SET
+        predicted_label = EXCLUDED.predicted_label,
+        confidence = EXCLUDED.confidence,
+        probabilities = EXCLUDED.probabilities,
+        created_at = NOW()
+"""
+
+ACCURACY_SQL = """
+    SELECT
+        s.split,
+        COUNT(p.sample_id) AS scored,
+        COUNT(*) AS total,
+        AVG((p.predicted_label = s.label)::int) AS accuracy
+    FROM demo.mnist_samples s
+    LEFT JOIN ml.mnist_predictions p
+        ON p.sample_id = s.id AND p.model_version = %s
+    GROUP BY s.split
+    ORDER BY s.split
+"""
+
+
+def _batches(cur, batch_size):
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        ids = [row[0] for row in rows]
+        # uint8-строки уходят в API как есть, float32 декодируются
+        images = [
+            vec if dtype == "uint8" else decode_vec(vec, n_rows, n_cols, dtype)
+            for _, vec, n_rows, n_cols, dtype in rows
+        ]
+        yield ids, images
+
+
+def _score(ids, images, version):
+    results = client.predict_batch(
+        images, timeout_s=BATCH_TIMEOUT_S, version=version, use_cache=False
+    )
+    values = []
+    for sample_id, (pred, probs, model_version) in zip(ids, results):
+        if model_version != version:
+            raise RuntimeError(f"API answered with {model_version!r} instead of {version!r}")
+        probs = [float(probs[i]) for i in range(len(probs))]
+        values.append((sample_id, version, pred, probs[pred], probs))
+    return values
+
+
+def _batch_size(value):
+    size = int(value)
+    if not 1 <= size <= PREDICT_BATCH_MAX_IMAGES:
+        raise argparse.ArgumentTypeError(
+            f"must be 1..{PREDICT_BATCH_MAX_IMAGES} (PREDICT_BATCH_MAX_IMAGES of ml-api)"
+        )
+    return size
+
+
+def score(version, splits, batch_size=BATCH_SIZE, jobs=2, force=False):
+    """
+    Считает и сохраняет предсказания version для всех строк splits.
+
+    Returns:
+        int: сколько строк записано
+    """
+    reader = get_conn()
+    writer = get_conn()
+    written = 0
+    started = time.perf_counter()
+    try:
+        with reader.cursor(name="mnist_score") as src, writer.cursor() as dst, \
+                ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            src.itersize = batch_size
+            src.execute(SELECT_SQL, {"splits": list(splits), "force": force, "version": version})
+
+            in_flight = deque()
+            batches = _batches(src, batch_size)
+            while True:
+                # держим до jobs запросов в полёте, пока пишем готовые
+                while len(in_flight) < max(1, jobs):
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    in_flight.append(pool.submit(_score, *batch, version))
+                if not in_flight:
+                    break
+
+                values = in_flight.popleft().result()
+                execute_values(
+                    dst, UPSERT_SQL, values,
+                    template="(%s, %s, %s, %s, %s::real[])", page_size=len(values),
+                )
+                writer.commit()
+                written += len(values)
+                print(f"   {written} строк ({written / (time.perf_counter() - started):.0f}/с)")
+        reader.rollback()
+    except Exception:
+        reader.rollback()
+        writer.rollback()
+        raise
+    finally:
+        put_conn(reader)
+        put_conn(writer)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute MNIST predictions into ml.mnist_predictions")
+    parser.add_argument("--version", help="model version; the API default if omitted")
+    parser.add_argument("--splits", nargs="+", default=["test", "train"])
+    parser.add_argument("--batch-size", type=_batch_size, default=BATCH_SIZE)
+    parser.add_argument("--jobs", type=int, default=2, help="requests in flight")
+    parser.add_argument("--force", action="store_true", help="rescore rows that already have a prediction")
+    args = parser.parse_args()
+
+    version = args.version or client.default_version()
+    print(f"🚀 Предрасчёт предсказаний модели {version} для {', '.join(args.splits)}")
+
+    started = time.perf_counter()
+    written = score(version, args.splits, args.batch_size, args.jobs, args.force)
+    print(f"✅ Записано {written} строк за {time.perf_counter() - started:.1f} с")
+
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(ACCURACY_SQL, (version,))
+            for split, scored, total, accuracy in cur.fetchall():
+                if scored:
+                    print(f"   {split}: accuracy {accuracy:.2%} ({scored}/{total})")
+    finally:
+        put_conn(conn)
+
+
+if __name__ == "__main__":
+    main()
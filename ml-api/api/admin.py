@@ -0,0 +1,16 @@
+import hmac
+
+from fastapi import Header, HTTPException
+
+from api.config import ADMIN_TOKEN
+
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    """FastAPI dependency guarding operational endpoints."""
+    if ADMIN_TOKEN is None:
+        raise HTTPException(
+            status_code=403,
+            detail="admin endpoints are disabled (ADMIN_TOKEN is not set)",
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="invalid admin token")
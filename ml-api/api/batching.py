@@ -0,0 +1,208 @@
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from api.metrics import STAGE_SECONDS
+
+
+class BatchStats:
+    """Counters for tuning BATCH_MAX_SIZE / BATCH_MAX_WAIT_MS."""
+
+    def __init__(self, window=1024):
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.batch_sizes = {}
+        self.queue_wait_ms = deque(maxlen=window)
+        self.forward_ms = deque(maxlen=window)
+
+    def record(self, batch_size, waits_ms, forward_ms):
+        self.requests += batch_size
+        self.batches += 1
+        self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+        self.queue_wait_ms.extend(waits_ms)
+        self.forward_ms.append(forward_ms)
+
+    @staticmethod
+    def _percentiles(values):
+        if not values:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        arr = np.fromiter(values, dtype=np.float64)
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        return {
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(arr.max()),
+        }
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch_size": (self.requests / self.batches) if self.batches else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_sizes.items())),
+            "queue_wait_ms": self._percentiles(self.queue_wait_ms),
+            "forward_ms": self._percentiles(self.forward_ms),
+        }
+
+
+class MicroBatcher:
+    """
+    Gathers single-image requests from an asyncio queue and runs them
+    through one batched forward pass.
+
+    A batch is closed when it reaches ``max_batch_size`` or when the
+    oldest request in it has waited ``max_wait_ms``. At most
+    ``max_concurrent_batches`` batches are in the model at a time, so
+    under load the queue keeps filling while earlier batches run and
+    batches grow with traffic.
+
+    ``run`` executes the forward pass off the event loop
+    (``await run(fn, x, key)``); it defaults to the anyio threadpool.
+    Requests submitted with different ``key`` values (model versions) are
+    never mixed in one forward: ``predict_batch(x, key)`` runs per key.
+    """
+
+    def __init__(
+            self,
+            predict_batch,
+            max_batch_size=32,
+            max_wait_ms=2.0,
+            run=None,
+            max_concurrent_batches=1,
+    ):
+        self._predict_batch = predict_batch
+        self._run_forward = run or run_in_threadpool
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+        self.stats = BatchStats()
+        self._queue = None
+        self._task = None
+        self._slots = None
+        self._inflight = set()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # Let batches already in the model finish
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        while not self._queue.empty():
+            _, _, fut, _ = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("batcher stopped"))
+
+    async def submit(self, arr_28x28: np.ndarray, key=None):
+        """Queue one (28, 28) image and wait for its (pred, probs)."""
+        if not self.running:
+            raise RuntimeError("batcher is not running")
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((arr_28x28, key, fut, time.perf_counter()))
+        return await fut
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Take everything already queued before waiting on the clock
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _loop(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            # Callers that gave up (client disconnect) are dropped here,
+            # the rest are split per key
+            groups = {}
+            for item in batch:
+                if not item[2].done():
+                    groups.setdefault(item[1], []).append(item)
+            if not groups:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._dispatch_groups(groups))
+            self._inflight.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task):
+        self._inflight.discard(task)
+        self._slots.release()
+
+    async def _dispatch_groups(self, groups):
+        for key, batch in groups.items():
+            await self._dispatch(key, batch)
+
+    async def _dispatch(self, key, batch):
+        started = time.perf_counter()
+        waits_ms = [(started - enqueued) * 1000.0 for _, _, _, enqueued in batch]
+        for wait_ms in waits_ms:
+            STAGE_SECONDS.observe(wait_ms / 1000.0, "queue_wait")
+        x = np.stack([arr for arr, _, _, _ in batch])
+
+        try:
+            preds, probs = await self._run_forward(self._predict_batch, x, key)
+        except asyncio.CancelledError:
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(RuntimeError("batcher stopped"))
+            raise
+        except Exception as exc:
+            self.stats.errors += 1
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+
+        self.stats.record(
+            len(batch), waits_ms, (time.perf_counter() - started) * 1000.0
+        )
+        for i, (_, _, fut, _) in enumerate(batch):
+            if not fut.done():
+                fut.set_result((int(preds[i]), probs[i]))
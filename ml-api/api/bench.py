@@ -0,0 +1,294 @@
+"""
+Offline benchmark and parity suite for every SmallCNN inference path.
+
+    python -m api.bench --version mnist_cnn --out bench.json
+
+Each variant (eager torch, torch_optimized, onnx, numpy and the int8
+TorchScript variant from api.quantize, when published) runs in its own
+subprocess, so import time and peak RSS are measured per engine and the
+numpy engine is never charged for torch. All variants see the same images
+from the local MNIST test split.
+
+Per variant and batch size the report has per-call and per-sample latency
+percentiles and throughput. The probabilities are compared with eager
+torch on the same images. fp32 variants must match within --atol with
+identical argmax; the int8 variant must agree on at least
+--min-int8-agreement of the argmax labels. The command exits non-zero
+when a parity check fails or a variant crashes, so it can gate a release;
+variants whose files are missing are reported as skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from api.config import MODEL_PATH
+from api.engines import TORCH_ENGINES, engine_class
+from api.mnist_data import load_split
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+REFERENCE = "torch"
+
+# name -> (engine, file in the model dir)
+VARIANTS = {
+    "torch": ("torch", "{version}.pth"),
+    "torch_optimized": ("torch_optimized", "{version}.pth"),
+    "onnx": ("onnx", "{version}.pth"),
+    "numpy": ("numpy", "{version}.pth"),
+    "int8": ("torch", "{version}_int8.ts"),
+}
+QUANTIZED_VARIANTS = {"int8"}
+
+
+def _peak_rss_bytes():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentiles(values_ms):
+    arr = np.asarray(values_ms, dtype=np.float64)
+    p50, p90, p99 = np.percentile(arr, [50, 90, 99])
+    return {
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(arr.max()),
+        "mean": float(arr.mean()),
+    }
+
+
+def _time_batch_size(engine, images, batch_size, min_images, min_calls, warmup):
+    n = len(images)
+    calls = max(min_calls, -(-min_images // batch_size))
+    starts = np.arange(warmup + calls) * batch_size % max(1, n - batch_size + 1)
+
+    for start in starts[:warmup]:
+        engine.predict_batch(images[start:start + batch_size])
+
+    latencies_ms = []
+    total_started = time.perf_counter()
+    for start in starts[warmup:]:
+        started = time.perf_counter()
+        engine.predict_batch(images[start:start + batch_size])
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+    total_s = time.perf_counter() - total_started
+
+    per_call = _percentiles(latencies_ms)
+    return {
+        "batch_size": batch_size,
+        "calls": calls,
+        "call_ms": per_call,
+        "per_sample_ms": {k: v / batch_size for k, v in per_call.items()},
+        "throughput_per_s": calls * batch_size / total_s,
+    }
+
+
+def run_variant(args):
+    """Child process: load one variant, time it, dump its probabilities."""
+    rss_start = _peak_rss_bytes()
+    images, _ = load_split("test")
+
+    started = time.perf_counter()
+    cls = engine_class(args.engine)
+    import_s = time.perf_counter() - started
+    if args.engine in TORCH_ENGINES:
+        from api.executor import _configure_torch_threads
+
+        _configure_torch_threads(args.threads, 1)
+
+    started = time.perf_counter()
+    engine = cls.load(args.model_version, Path(args.path))
+    load_s = time.perf_counter() - started
+    rss_loaded = _peak_rss_bytes()
+
+    parity = images[:args.parity_size]
+    probs = np.concatenate([
+        engine.predict_batch(parity[i:i + 256])[1]
+        for i in range(0, len(parity), 256)
+    ])
+    np.save(args.probs_out, probs.astype(np.float32))
+
+    batches = [
+        _time_batch_size(engine, images, b, args.min_images, args.min_calls, args.warmup)
+        for b in args.batch_sizes
+    ]
+
+    json.dump({
+        "engine": args.engine,
+        "import_s": import_s,
+        "load_s": load_s,
+        "peak_rss_bytes": {
+            "start": rss_start,
+            "after_load": rss_loaded,
+            "end": _peak_rss_bytes(),
+        },
+        "batches": batches,
+    }, sys.stdout)
+
+
+def _spawn_variant(name, engine, path, args, probs_out):
+    env = dict(os.environ)
+    threads = str(args.threads)
+    env.update(
+        OMP_NUM_THREADS=threads,
+        MKL_NUM_THREADS=threads,
+        ONNX_INTRA_OP_THREADS=threads,
+    )
+    cmd = [
+        sys.executable, "-m", "api.bench", "--child",
+        "--engine", engine,
+        "--path", str(path),
+        "--model-version", args.version,
+        "--probs-out", probs_out,
+        "--threads", threads,
+        "--batch-sizes", ",".join(map(str, args.batch_sizes)),
+        "--parity-size", str(args.parity_size),
+        "--min-images", str(args.min_images),
+        "--min-calls", str(args.min_calls),
+        "--warmup", str(args.warmup),
+    ]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"status": "error", "error": proc.stderr.strip().splitlines()[-20:]}
+    result = json.loads(proc.stdout)
+    result["status"] = "ok"
+    print(f"✅ {name}: load {result['load_s']:.2f}s", file=sys.stderr)
+    return result
+
+
+def _parity(name, probs, reference, labels, args):
+    preds, ref_preds = probs.argmax(axis=1), reference.argmax(axis=1)
+    agreement = float((preds == ref_preds).mean())
+    max_abs = float(np.abs(probs - reference).max())
+    if name in QUANTIZED_VARIANTS:
+        passed = agreement >= args.min_int8_agreement
+    else:
+        passed = agreement == 1.0 and max_abs <= args.atol
+    return {
+        "max_abs_diff": max_abs,
+        "argmax_agreement": agreement,
+        "accuracy": float((preds == labels).mean()),
+        "passed": passed,
+    }
+
+
+def run_suite(args):
+    model_dir = Path(args.model_dir)
+    _, labels = load_split("test")
+    labels = labels[:args.parity_size]
+
+    report = {
+        "version": args.version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "threads": args.threads,
+            "batch_sizes": list(args.batch_sizes),
+            "parity_size": int(len(labels)),
+            "atol": args.atol,
+            "min_int8_agreement": args.min_int8_agreement,
+        },
+        "variants": {},
+    }
+
+    names = [REFERENCE] + [n for n in args.variants if n != REFERENCE]
+    probs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            engine, filename = VARIANTS[name]
+            path = model_dir / filename.format(version=args.version)
+            if not path.exists():
+                report["variants"][name] = {"status": "skipped", "error": f"{path} not found"}
+                continue
+            probs_out = os.path.join(tmp, f"{name}.npy")
+            result = _spawn_variant(name, engine, path, args, probs_out)
+            if result["status"] == "ok":
+                probs[name] = np.load(probs_out)
+            report["variants"][name] = result
+
+    if REFERENCE not in probs:
+        raise SystemExit(
+            f"❌ reference variant {REFERENCE!r} did not run: "
+            f"{report['variants'][REFERENCE]['error']}"
+        )
+
+    failed = []
+    for name, result in report["variants"].items():
+        if name in probs:
+            result["parity"] = _parity(name, probs[name], probs[REFERENCE], labels, args)
+            if not result["parity"]["passed"]:
+                failed.append(name)
+    report["parity_failed"] = failed
+    report["errors"] = [
+        name for name, result in report["variants"].items() if result["status"] == "error"
+    ]
+    return report
+
+
+def _int_list(value):
+    return tuple(int(v) for v in value.split(",") if v)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and cross-check SmallCNN engines")
+    parser.add_argument("--version", default="mnist_cnn")
+    parser.add_argument("--model-dir", default=os.path.join(MODEL_PATH, "mnist"))
+    parser.add_argument("--variants", type=lambda v: v.split(","), default=list(VARIANTS),
+                        help=f"comma-separated subset of {','.join(VARIANTS)}")
+    parser.add_argument("--batch-sizes", type=_int_list, default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--threads", type=int, default=1, help="intra-op threads per engine")
+    parser.add_argument("--parity-size", type=int, default=1000)
+    parser.add_argument("--atol", type=float, default=1e-4,
+                        help="max |probs - eager torch probs| for fp32 variants")
+    parser.add_argument("--min-int8-agreement", type=float, default=0.99)
+    parser.add_argument("--min-images", type=int, default=4096,
+                        help="images timed per batch size")
+    parser.add_argument("--min-calls", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    # internal: one variant per subprocess
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--model-version", help=argparse.SUPPRESS)
+    parser.add_argument("--probs-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_variant(args)
+        return
+
+    unknown = set(args.variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"unknown variants {sorted(unknown)}, expected {sorted(VARIANTS)}")
+
+    report = run_suite(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+
+    if report["parity_failed"]:
+        print(f"❌ parity check failed: {', '.join(report['parity_failed'])}", file=sys.stderr)
+    if report["errors"]:
+        print(f"❌ variants failed to run: {', '.join(report['errors'])}", file=sys.stderr)
+    if report["parity_failed"] or report["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
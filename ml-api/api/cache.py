@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Rough per-entry overhead (OrderedDict slot, tuple, key bytes, ndarray header)
+_ENTRY_OVERHEAD = 256
+
+
+class PredictionCache:
+    """
+    Content-addressed LRU cache of (pred, probs) per image and model version.
+
+    The key is a blake2b digest of the model version plus the image as
+    canonical uint8 bytes, so the same digit sent as JSON floats, raw
+    bytes or .npy hits the same entry. Images that are not exactly
+    representable as uint8 (fractional or out-of-range pixels) bypass
+    the cache rather than be rounded onto another image's entry.
+
+    Bounded by ``max_bytes`` (LRU eviction) and ``ttl_s``; entries of a
+    version are dropped when the registry swaps the default away from it.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_s=3600.0):
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(arr_28x28, version):
+        """Cache key for one image, or None if it cannot be cached exactly."""
+        if arr_28x28.dtype == np.uint8:
+            pixels = arr_28x28
+        else:
+            pixels = arr_28x28.astype(np.uint8)
+            if not np.array_equal(pixels, arr_28x28):
+                return None
+        h = hashlib.blake2b(digest_size=16)
+        h.update(version.encode("utf-8"))
+        h.update(b"\0")
+        h.update(np.ascontiguousarray(pixels).data)
+        return h.digest()
+
+    def get(self, key):
+        if key is None:
+            self.bypassed += 1
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, pred, probs, _ = entry
+            if expires_at < now:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pred, probs
+
+    def put(self, key, version, pred, probs):
+        if key is None:
+            return
+        probs = np.array(probs, dtype=np.float32)
+        probs.flags.writeable = False
+        size = len(key) + probs.nbytes + _ENTRY_OVERHEAD
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (
+                time.monotonic() + self.ttl_s, version, int(pred), probs, size
+            )
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry[4]
+
+    def invalidate(self, version=None):
+        """Drop entries of ``version`` (all entries if None)."""
+        with self._lock:
+            if version is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self.bytes = 0
+            else:
+                stale = [k for k, e in self._entries.items() if e[1] == version]
+                for k in stale:
+                    self._drop(k)
+                dropped = len(stale)
+            self.invalidations += dropped
+        return dropped
+
+    def snapshot(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,115 @@
+import io
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Supported request body formats
+JSON = "application/json"
+OCTET_STREAM = "application/octet-stream"  # N x 784 uint8, row-major, no header
+NPY = "application/x-npy"  # numpy .npy, uint8 or float32, (784,) / (28, 28) / (N, ...)
+
+BINARY_MEDIA_TYPES = (OCTET_STREAM, NPY)
+
+IMAGE_SHAPE = (28, 28)
+IMAGE_SIZE = IMAGE_SHAPE[0] * IMAGE_SHAPE[1]
+
+
+class PayloadError(ValueError):
+    """Body could not be decoded into (N, 28, 28) images."""
+
+
+class UnsupportedMediaType(PayloadError):
+    pass
+
+
+def media_type(content_type):
+    if not content_type:
+        return JSON
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def _as_images(arr):
+    if arr.size == 0 or arr.size % IMAGE_SIZE:
+        raise PayloadError(
+            f"payload must hold a multiple of {IMAGE_SIZE} pixels, got {arr.size}"
+        )
+    return arr.reshape(-1, *IMAGE_SHAPE)
+
+
+def _check_range(arr):
+    """Float pixels must be finite and within 0..255 (uint8 always is)."""
+    if not np.isfinite(arr).all():
+        raise PayloadError("pixels must be finite numbers (got null, NaN or inf)")
+    if arr.size and (arr.min() < 0 or arr.max() > 255):
+        raise PayloadError("pixels must be within 0..255")
+    return arr
+
+
+def decode_raw(body):
+    """Packed uint8 images -> (N, 28, 28) view over the request bytes."""
+    return _as_images(np.frombuffer(body, dtype=np.uint8))
+
+
+def decode_npy(body):
+    """Parse the .npy header and wrap the payload without copying it."""
+    f = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    except ValueError as exc:
+        raise PayloadError(f"invalid .npy payload: {exc}") from exc
+
+    if dtype not in (np.dtype(np.uint8), np.dtype("<f4")):
+        raise PayloadError(f"unsupported .npy dtype {dtype}, expected uint8 or float32")
+
+    count = int(np.prod(shape))
+    try:
+        arr = np.frombuffer(body, dtype=dtype, count=count, offset=f.tell())
+    except ValueError as exc:
+        raise PayloadError(f"truncated .npy payload: {exc}") from exc
+
+    if fortran_order:
+        # Rare in practice; this is the only path that copies
+        arr = np.ascontiguousarray(arr.reshape(shape[::-1]).T)
+    if arr.dtype != np.uint8:
+        _check_range(arr)
+    return _as_images(arr)
+
+
+def decode_json(body, key):
+    """
+    Fast JSON path: parse with orjson and hand the nested lists straight
+    to numpy, skipping per-element pydantic validation.
+    """
+    try:
+        payload = orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError as exc:
+        raise PayloadError(f"invalid JSON: {exc}") from exc
+
+    if not isinstance(payload, dict) or key not in payload:
+        raise PayloadError(f"JSON body must be an object with a {key!r} field")
+
+    try:
+        # values beyond float32 become inf and are rejected by _check_range
+        with np.errstate(over="ignore"):
+            arr = np.asarray(payload[key], dtype=np.float32)
+    except (ValueError, TypeError) as exc:
+        raise PayloadError(f"{key!r} must be a numeric array: {exc}") from exc
+    return _as_images(_check_range(arr))
+
+
+def decode_images(body, content_type):
+    mt = media_type(content_type)
+    if mt == OCTET_STREAM:
+        return decode_raw(body)
+    if mt == NPY:
+        return decode_npy(body)
+    raise UnsupportedMediaType(f"unsupported content type {mt!r}")
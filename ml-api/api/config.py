@@ -0,0 +1,69 @@
+import os
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+APP_ENV = os.getenv("APP_ENV", "dev")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+# Model registry: every MODEL_PATH/mnist/<version>.pth is a servable version
+MODEL_PATH = os.getenv("MODEL_PATH", "models")
+MODEL_DEFAULT_VERSION = os.getenv("MODEL_DEFAULT_VERSION") or None  # None = latest
+# Unknown ?version= rescans the directory at most once per this many seconds
+MODEL_RESCAN_MIN_INTERVAL_S = float(os.getenv("MODEL_RESCAN_MIN_INTERVAL_S", "5"))
+# Set by api.serve for its workers: <dir>/<version>.pt weights to mmap
+MODEL_SHARED_WEIGHTS_DIR = os.getenv("MODEL_SHARED_WEIGHTS_DIR") or None
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+
+# On-demand profiling (POST /admin/profile): artifacts land in PROFILE_DIR/<id>/
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+# Local MNIST idx files (calibration, accuracy gates, benchmarks)
+MNIST_DATA_DIR = os.getenv("MNIST_DATA_DIR", "../data/MNIST/raw")
+
+# Inference backend (api.engines): torch | torch_optimized | onnx | numpy;
+# torch is the fallback
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "torch")
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 = cores / workers
+
+# Dynamic micro-batching in front of the model
+BATCH_ENABLED = _env_bool("BATCH_ENABLED", True)
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "2"))
+
+# Warmup before /ready: WARMUP_ROUNDS synthetic batches per size on every
+# inference worker; empty WARMUP_BATCH_SIZES = powers of two up to BATCH_MAX_SIZE
+WARMUP_ENABLED = _env_bool("WARMUP_ENABLED", True)
+WARMUP_BATCH_SIZES = [int(v) for v in os.getenv("WARMUP_BATCH_SIZES", "").split(",") if v.strip()]
+WARMUP_ROUNDS = int(os.getenv("WARMUP_ROUNDS", "3"))
+
+# Upper bound on images accepted by /mnist/predict_batch
+PREDICT_BATCH_MAX_IMAGES = int(os.getenv("PREDICT_BATCH_MAX_IMAGES", "512"))
+
+# JSON bodies: orjson + numpy instead of per-element pydantic validation
+JSON_FAST_PATH = _env_bool("JSON_FAST_PATH", True)
+
+# Content-addressed prediction cache
+CACHE_ENABLED = _env_bool("CACHE_ENABLED", True)
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "3600"))
+
+# Dedicated inference executor and admission control
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+TORCH_INTRA_OP_THREADS = int(os.getenv("TORCH_INTRA_OP_THREADS", "0"))  # 0 = cores / workers
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "256"))
+INFERENCE_RETRY_AFTER_S = int(os.getenv("INFERENCE_RETRY_AFTER_S", "1"))
+
+# Multi-process serving (python -m api.serve)
+SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "0"))  # 0 = one per CPU
+SERVE_PIN_CPUS = _env_bool("SERVE_PIN_CPUS", True)
+SHARED_WEIGHTS_DIR = os.getenv("SHARED_WEIGHTS_DIR", "/dev/shm")
@@ -0,0 +1,48 @@
+"""
+Inference engines for SmallCNN.
+
+An engine wraps one loaded model version and exposes
+``predict_batch(x) -> (preds, probs)`` for an (N, 28, 28) array of pixel
+values in 0..255. Engine modules are imported lazily, so only the
+selected backend's dependencies (torch, onnxruntime, ...) get loaded.
+"""
+import importlib
+import logging
+
+DEFAULT_ENGINE = "torch"
+
+ENGINES = {
+    "torch": "api.engines.torch_engine:TorchEngine",
+    "torch_optimized": "api.engines.torch_optimized:TorchOptimizedEngine",
+    "onnx": "api.engines.onnx_engine:OnnxEngine",
+    "numpy": "api.engines.numpy_engine:NumpyEngine",
+}
+
+# Engines whose forward pass runs inside torch (thread settings apply)
+TORCH_ENGINES = {"torch", "torch_optimized"}
+
+logger = logging.getLogger(__name__)
+
+
+def engine_class(name):
+    try:
+        module, cls = ENGINES[name].split(":")
+    except KeyError:
+        raise ValueError(
+            f"unknown inference engine {name!r}, expected one of {sorted(ENGINES)}"
+        ) from None
+    return getattr(importlib.import_module(module), cls)
+
+
+def load_engine(name, version, path):
+    """Load ``version`` with engine ``name``, falling back to eager torch."""
+    try:
+        return engine_class(name).load(version, path)
+    except Exception:
+        if name == DEFAULT_ENGINE:
+            raise
+        logger.exception(
+            "engine %r failed to load %s, falling back to %r",
+            name, version, DEFAULT_ENGINE,
+        )
+        return engine_class(DEFAULT_ENGINE).load(version, path)
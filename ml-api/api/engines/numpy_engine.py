@@ -0,0 +1,139 @@
+"""
+Torch-free SmallCNN forward pass in NumPy.
+
+Weights are exported once from the .pth checkpoint to ``<version>.npz``
+next to it; after that the engine only needs numpy, so a replica running
+INFERENCE_ENGINE=numpy never imports torch. Export ahead of time with
+
+    python -m api.engines.numpy_engine models/mnist/*.pth
+"""
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from api.metrics import StageClock
+
+# state_dict keys of SmallCNN.net
+_PARAMS = {
+    "conv1_w": "net.0.weight",
+    "conv1_b": "net.0.bias",
+    "conv2_w": "net.3.weight",
+    "conv2_b": "net.3.bias",
+    "fc1_w": "net.7.weight",
+    "fc1_b": "net.7.bias",
+    "fc2_w": "net.9.weight",
+    "fc2_b": "net.9.bias",
+}
+
+PARITY_ATOL = 1e-5
+
+
+def weights_path_for(checkpoint_path):
+    return Path(checkpoint_path).with_suffix(".npz")
+
+
+def export_weights(checkpoint_path, npz_path=None, verify=True):
+    """Dump the checkpoint's tensors to .npz; optionally check parity with torch."""
+    import torch
+
+    npz_path = Path(npz_path or weights_path_for(checkpoint_path))
+    state_dict = torch.load(checkpoint_path, map_location="cpu")["state_dict"]
+    arrays = {
+        name: state_dict[key].detach().numpy().astype(np.float32)
+        for name, key in _PARAMS.items()
+    }
+
+    if verify:
+        from api.engines.torch_engine import TorchEngine, load_model
+
+        x = np.random.default_rng(0).integers(0, 256, size=(64, 28, 28)).astype(np.float32)
+        _, expected = TorchEngine(load_model(str(checkpoint_path))).predict_batch(x)
+        _, actual = NumpyEngine(arrays).predict_batch(x)
+        max_err = float(np.abs(expected - actual).max())
+        if max_err > PARITY_ATOL:
+            raise RuntimeError(
+                f"numpy engine diverges from torch by {max_err:.2e} on {checkpoint_path}"
+            )
+
+    tmp_path = npz_path.with_name(f"{npz_path.stem}.{os.getpid()}.tmp.npz")
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, npz_path)
+    return npz_path
+
+
+def _conv3x3_relu(x, w_mat, b):
+    """3x3 'same' conv + ReLU on NHWC input via an im2col matmul."""
+    n, h, w, _ = x.shape
+    xp = np.pad(x, ((0, 0), (1, 1), (1, 1), (0, 0)))
+    # (N, H, W, C, 3, 3) strided view -> (N*H*W, C*9) patch matrix
+    cols = sliding_window_view(xp, (3, 3), axis=(1, 2)).reshape(n * h * w, -1)
+    out = cols @ w_mat
+    out += b
+    np.maximum(out, 0, out=out)
+    return out.reshape(n, h, w, -1)
+
+
+def _maxpool2(x):
+    n, h, w, c = x.shape
+    return x.reshape(n, h // 2, 2, w // 2, 2, c).max(axis=(2, 4))
+
+
+class NumpyEngine:
+    """SmallCNN forward in NHWC layout with vectorized im2col convolutions."""
+
+    name = "numpy"
+
+    def __init__(self, arrays):
+        # Conv weights (O, C, 3, 3) -> (C*9, O), matching the patch layout
+        self.conv1_w = np.ascontiguousarray(arrays["conv1_w"].reshape(16, -1).T)
+        self.conv1_b = arrays["conv1_b"]
+        self.conv2_w = np.ascontiguousarray(arrays["conv2_w"].reshape(32, -1).T)
+        self.conv2_b = arrays["conv2_b"]
+        # torch flattens NCHW; permute fc1's inputs once so NHWC can be
+        # flattened directly
+        fc1_w = arrays["fc1_w"].reshape(128, 32, 7, 7).transpose(0, 2, 3, 1)
+        self.fc1_w = np.ascontiguousarray(fc1_w.reshape(128, -1).T)
+        self.fc1_b = arrays["fc1_b"]
+        self.fc2_w = np.ascontiguousarray(arrays["fc2_w"].T)
+        self.fc2_b = arrays["fc2_b"]
+
+    @classmethod
+    def load(cls, version, path):
+        npz_path = weights_path_for(path)
+        if (
+                not npz_path.exists()
+                or npz_path.stat().st_mtime < Path(path).stat().st_mtime
+        ):
+            export_weights(path, npz_path)
+        with np.load(npz_path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in _PARAMS})
+
+    def predict_batch(self, arr_nx28x28: np.ndarray):
+        clock = StageClock()
+        n = len(arr_nx28x28)
+        x = np.asarray(arr_nx28x28, dtype=np.float32).reshape(n, 28, 28, 1) * np.float32(1 / 255.0)
+        clock.lap("tensor_build")
+
+        x = _maxpool2(_conv3x3_relu(x, self.conv1_w, self.conv1_b))
+        x = _maxpool2(_conv3x3_relu(x, self.conv2_w, self.conv2_b))
+
+        x = x.reshape(n, -1) @ self.fc1_w
+        x += self.fc1_b
+        np.maximum(x, 0, out=x)
+        logits = x @ self.fc2_w
+        logits += self.fc2_b
+        clock.lap("forward")
+
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        clock.lap("softmax")
+        return probs.argmax(axis=1), probs
+
+
+if __name__ == "__main__":
+    for checkpoint in sys.argv[1:]:
+        print(f"{checkpoint} -> {export_weights(checkpoint)}")
@@ -0,0 +1,96 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+
+from api.config import INFERENCE_WORKERS, ONNX_INTRA_OP_THREADS
+from api.executor import available_cpu_count
+from api.metrics import StageClock
+
+OPSET_VERSION = 17
+
+
+def onnx_path_for(checkpoint_path):
+    """ONNX export cached next to the checkpoint: mnist_cnn.pth -> mnist_cnn.onnx."""
+    return Path(checkpoint_path).with_suffix(".onnx")
+
+
+def export_onnx(checkpoint_path, onnx_path):
+    """
+    Export SmallCNN with the /255 scaling and softmax baked into the graph,
+    so the session maps raw (N, 28, 28) pixels straight to probabilities.
+    """
+    import torch
+    import torch.nn.functional as F
+
+    from api.engines.torch_engine import load_model
+
+    class _ProbsModel(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixels):
+            return F.softmax(self.model(pixels.unsqueeze(1) / 255.0), dim=1)
+
+    wrapper = _ProbsModel(load_model(str(checkpoint_path))).eval()
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    torch.onnx.export(
+        wrapper,
+        (torch.zeros(1, 28, 28),),
+        tmp_path,
+        input_names=["pixels"],
+        output_names=["probs"],
+        dynamic_axes={"pixels": {0: "batch"}, "probs": {0: "batch"}},
+        opset_version=OPSET_VERSION,
+        dynamo=False,
+    )
+    os.replace(tmp_path, onnx_path)
+    return onnx_path
+
+
+def ensure_onnx(checkpoint_path):
+    """Path to an up-to-date ONNX export, (re)exporting when stale."""
+    onnx_path = onnx_path_for(checkpoint_path)
+    if (
+            not onnx_path.exists()
+            or onnx_path.stat().st_mtime < Path(checkpoint_path).stat().st_mtime
+    ):
+        export_onnx(checkpoint_path, onnx_path)
+    return onnx_path
+
+
+class OnnxEngine:
+    """SmallCNN on ONNX Runtime's CPU execution provider."""
+
+    name = "onnx"
+
+    def __init__(self, session):
+        self.session = session
+        self._input = session.get_inputs()[0].name
+
+    @classmethod
+    def load(cls, version, path):
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # Same core budget per executor worker as the torch engine
+        opts.intra_op_num_threads = ONNX_INTRA_OP_THREADS or max(
+            1, available_cpu_count() // max(1, INFERENCE_WORKERS)
+        )
+        opts.inter_op_num_threads = 1
+
+        session = ort.InferenceSession(
+            str(ensure_onnx(path)), opts, providers=["CPUExecutionProvider"]
+        )
+        return cls(session)
+
+    def predict_batch(self, arr_nx28x28: np.ndarray):
+        clock = StageClock()
+        x = np.ascontiguousarray(arr_nx28x28, dtype=np.float32)
+        clock.lap("tensor_build")
+        # /255 and softmax are part of the exported graph
+        probs = self.session.run(None, {self._input: x})[0]
+        clock.lap("forward")
+        return probs.argmax(axis=1), probs
@@ -0,0 +1,95 @@
+import os
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import numpy as np
+
+from api.config import MODEL_SHARED_WEIGHTS_DIR
+from api.metrics import StageClock
+
+
+class SmallCNN(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.net = nn.Sequential(
+            nn.Conv2d(1, 16, 3, padding=1),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+
+            nn.Conv2d(16, 32, 3, padding=1),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+
+            nn.Flatten(),
+
+            nn.Linear(32 * 7 * 7, 128),
+            nn.ReLU(),
+
+            nn.Linear(128, 10)
+        )
+
+    def forward(self, x):
+        return self.net(x)
+
+
+def load_model(path="models/mnist/mnist_cnn.pth"):
+    ckpt = torch.load(path, map_location="cpu")
+    model = SmallCNN()
+    model.load_state_dict(ckpt["state_dict"])
+    model.eval()
+    return model
+
+
+def load_torchscript_model(path):
+    """TorchScript variants, e.g. the int8 SmallCNN published by api.quantize."""
+    if "x86" in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = "x86"
+    model = torch.jit.load(str(path), map_location="cpu")
+    model.eval()
+    return model
+
+
+def load_shared_model(path):
+    """
+    Attach to weights written by ``api.serve.export_shared_weights`` without
+    copying: parameters stay backed by the mmapped file, shared by every
+    process.
+    """
+    ckpt = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    model = SmallCNN()
+    model.load_state_dict(ckpt["state_dict"], assign=True)
+    model.eval()
+    return model
+
+
+class TorchEngine:
+    """Eager PyTorch SmallCNN; the default engine and the fallback for others."""
+
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    @classmethod
+    def load(cls, version, path):
+        if Path(path).suffix == ".ts":
+            return cls(load_torchscript_model(path))
+        if MODEL_SHARED_WEIGHTS_DIR:
+            shared = os.path.join(MODEL_SHARED_WEIGHTS_DIR, f"{version}.pt")
+            if os.path.exists(shared):
+                return cls(load_shared_model(shared))
+        return cls(load_model(path))
+
+    def predict_batch(self, arr_nx28x28: np.ndarray):
+        clock = StageClock()
+        x = torch.from_numpy(np.array(arr_nx28x28, dtype=np.float32)).unsqueeze(1) / 255.0
+        clock.lap("tensor_build")
+        with torch.no_grad():
+            logits = self.model(x)
+            clock.lap("forward")
+            probs = F.softmax(logits, dim=1).numpy()
+        clock.lap("softmax")
+
+        return probs.argmax(axis=1), probs
@@ -0,0 +1,98 @@
+"""
+SmallCNN rewritten for serving, built from the checkpoint at load time:
+
+- the /255 input scaling is folded into conv1's weights (padding is zero,
+  so conv(x / 255, W) == conv(x, W / 255)), and raw pixels, uint8 included,
+  go straight into the graph
+- Conv+ReLU and Linear+ReLU pairs are fused, then the module is scripted,
+  frozen and optimized for inference, so the uint8 -> float cast,
+  channels_last layout and softmax all run inside one TorchScript graph
+- the result is checked against the eager model before it is served;
+  on divergence the load fails and ``api.engines.load_engine`` falls back
+  to eager torch
+"""
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.ao.quantization import fuse_modules
+
+from api.engines.torch_engine import TorchEngine, load_model
+from api.metrics import StageClock
+
+PARITY_ATOL = 1e-5
+
+# SmallCNN.net indices: conv1, relu, pool, conv2, relu, pool, flatten, fc1, relu, fc2
+_FUSE_GROUPS = [["0", "1"], ["3", "4"], ["7", "8"]]
+
+
+class _ServingCNN(nn.Module):
+    def __init__(self, net):
+        super().__init__()
+        self.net = net
+
+    def forward(self, pixels: torch.Tensor) -> torch.Tensor:
+        x = pixels.unsqueeze(1).to(torch.float32)
+        x = x.contiguous(memory_format=torch.channels_last)
+        return F.softmax(self.net(x), dim=1)
+
+
+def optimize_model(model):
+    """Fold, fuse and freeze an eval-mode SmallCNN; returns a TorchScript module."""
+    net = model.net
+    with torch.no_grad():
+        net[0].weight.div_(255.0)
+    fuse_modules(net, _FUSE_GROUPS, inplace=True)
+
+    serving = _ServingCNN(net).eval().to(memory_format=torch.channels_last)
+    with warnings.catch_warnings():
+        # torch.jit is deprecated in favour of torch.compile, but still the
+        # cheapest per-call path on CPU for a model this small
+        warnings.simplefilter("ignore", FutureWarning)
+        frozen = torch.jit.freeze(torch.jit.script(serving))
+        return torch.jit.optimize_for_inference(frozen)
+
+
+def check_parity(reference, optimized, path):
+    x = np.random.default_rng(0).integers(0, 256, size=(64, 28, 28), dtype=np.uint8)
+    _, expected = TorchEngine(reference).predict_batch(x)
+    _, actual = TorchOptimizedEngine(optimized).predict_batch(x)
+    max_err = float(np.abs(expected - actual).max())
+    if max_err > PARITY_ATOL:
+        raise RuntimeError(
+            f"optimized torch model diverges from eager by {max_err:.2e} on {path}"
+        )
+
+
+class TorchOptimizedEngine:
+    """Folded, fused and frozen SmallCNN; takes raw uint8 or float pixels."""
+
+    name = "torch_optimized"
+
+    def __init__(self, model):
+        self.model = model
+
+    @classmethod
+    def load(cls, version, path):
+        optimized = optimize_model(load_model(str(path)))
+        check_parity(load_model(str(path)), optimized, path)
+        return cls(optimized)
+
+    def predict_batch(self, arr_nx28x28: np.ndarray):
+        clock = StageClock()
+        arr = np.asarray(arr_nx28x28)
+        if arr.dtype != np.uint8:
+            arr = arr.astype(np.float32, copy=False)
+        if not arr.flags.writeable:
+            # zero-copy request buffers are read-only; torch wants writable memory
+            arr = arr.copy()
+        x = torch.from_numpy(arr)
+        clock.lap("tensor_build")
+        with torch.inference_mode():
+            # softmax is part of the frozen graph
+            probs = self.model(x).numpy()
+        clock.lap("forward")
+
+        return probs.argmax(axis=1), probs
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class Overloaded(RuntimeError):
+    """Raised when admission control rejects a request (HTTP 429)."""
+
+    def __init__(self, retry_after_s):
+        super().__init__("inference queue is full")
+        self.retry_after_s = retry_after_s
+
+
+def available_cpu_count():
+    # Respects CPU pinning (api.serve --pin-cpus, taskset, cgroups cpusets)
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _configure_torch_threads(intra_op_threads, interop_threads):
+    # Imported lazily so engines that do not use torch never load it
+    import torch
+
+    torch.set_num_threads(intra_op_threads)
+    try:
+        # Only allowed once per process, before any inter-op work started
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        pass
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pool for model forward passes.
+
+    The default anyio threadpool lets every concurrent request call into
+    torch with the full intra-op thread count, which oversubscribes the
+    cores. Here ``workers x intra_op_threads`` is fixed up front, and
+    ``admit()`` caps the number of requests inside the service at
+    ``max_pending``; anything above that is rejected with ``Overloaded``
+    instead of queueing without bound.
+    """
+
+    def __init__(
+            self,
+            workers=1,
+            intra_op_threads=0,
+            interop_threads=1,
+            max_pending=256,
+            retry_after_s=1,
+            configure_torch=True,
+    ):
+        self.workers = max(1, int(workers))
+        # 0 = split the cores this process may run on evenly between workers
+        self.intra_op_threads = int(intra_op_threads) or max(
+            1, available_cpu_count() // self.workers
+        )
+        self.interop_threads = max(1, int(interop_threads))
+        self.max_pending = max(1, int(max_pending))
+        self.retry_after_s = max(1, int(retry_after_s))
+        self.configure_torch = configure_torch
+
+        self.pending = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._pool = None
+        # One run_on_each_worker at a time: two interleaved barrier rounds
+        # each hold some workers and wait for the rest until they time out
+        self._each_worker_lock = asyncio.Lock()
+
+    def _init_worker(self):
+        if self.configure_torch:
+            # With the OpenMP backend the setting is per calling thread
+            import torch
+
+            torch.set_num_threads(self.intra_op_threads)
+
+    def start(self):
+        if self._pool is not None:
+            return
+        if self.configure_torch:
+            _configure_torch_threads(self.intra_op_threads, self.interop_threads)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="inference",
+            initializer=self._init_worker,
+        )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    @contextmanager
+    def admit(self):
+        """
+        Reserve a slot for one request for the duration of the block.
+
+        Only called from the event loop thread, so plain counters suffice.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(self.retry_after_s)
+        self.pending += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+
+    async def run(self, fn, *args):
+        if self._pool is None:
+            raise RuntimeError("inference executor is not started")
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def run_on_each_worker(self, fn, timeout_s=30.0):
+        """
+        Call ``fn()`` once on every worker thread, e.g. to start or stop
+        thread-local state such as torch.profiler.
+
+        The barrier keeps each worker busy until all of them have picked
+        up a call, so no thread runs two. Concurrent callers (profiling,
+        hot-swap warmup) are serialized. Results are in arbitrary order.
+        """
+        async with self._each_worker_lock:
+            barrier = threading.Barrier(self.workers)
+
+            def on_worker():
+                barrier.wait(timeout_s)
+                return fn()
+
+            return await asyncio.gather(*(self.run(on_worker) for _ in range(self.workers)))
+
+    def snapshot(self):
+        return {
+            "workers": self.workers,
+            "intra_op_threads": self.intra_op_threads,
+            "interop_threads": self.interop_threads,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,395 @@
+"""
+HTTP load generator for ml-api.
+
+    # closed loop: N clients sending back to back
+    python -m api.loadgen --url http://127.0.0.1:8000 --concurrency 1,8,32,128
+    # open loop: arrivals at fixed rates, whether or not the server keeps up
+    python -m api.loadgen --rate 200,500,1000 --route predict_batch --batch-images 16
+    # start a local server for the run (uvicorn, or api.serve with --server-workers)
+    python -m api.loadgen --spawn-server --concurrency 16 --out load.json
+
+Bodies are built from the MNIST test split (--format octet|npy|json) or
+replayed from a JSON-lines capture (--capture). Each capture line holds
+``{"path": ..., "json": {...}}`` or ``{"path": ..., "content_type": ...,
+"body_b64": ...}``. The default path is the one for --route.
+
+Latency is reported raw and corrected for coordinated omission:
+- open loop measures from the scheduled send time, so time a request
+  spent waiting behind a slow server is counted
+- closed loop adds the samples a stalled client failed to send (HdrHistogram's
+  expected-interval correction; the interval defaults to the raw p50)
+
+A large max_dispatch_lag_ms on an open-loop level means the generator,
+not the server, was the bottleneck; run it on a separate machine or core.
+The prediction cache answers repeated images without running the model.
+Start the server with CACHE_ENABLED=false to load the model itself.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from api.codecs import IMAGE_SIZE, JSON, NPY, OCTET_STREAM
+from api.mnist_data import load_split
+
+ML_API_DIR = Path(__file__).resolve().parents[1]
+
+ROUTES = {"predict": "/mnist/predict", "predict_batch": "/mnist/predict_batch"}
+FORMATS = {"octet": OCTET_STREAM, "npy": NPY, "json": JSON}
+
+PERCENTILES = {"p50": 50, "p90": 90, "p95": 95, "p99": 99, "p999": 99.9}
+
+# Log-spaced histogram buckets: 4 per doubling from 50us to ~100s
+HISTOGRAM_EDGES_MS = 0.05 * 2 ** (np.arange(85) / 4)
+
+
+def _encode(images, fmt, single):
+    if fmt == "octet":
+        return images.tobytes()
+    if fmt == "npy":
+        buf = io.BytesIO()
+        np.save(buf, images[0] if single else images)
+        return buf.getvalue()
+    flat = images.reshape(len(images), IMAGE_SIZE).tolist()
+    body = {"pixels": flat[0]} if single else {"images": flat}
+    return json.dumps(body).encode()
+
+
+def mnist_payloads(route, fmt, batch_images, limit):
+    """(path, body, headers) requests built from the MNIST test split."""
+    images, _ = load_split("test")
+    per_request = 1 if route == "predict" else batch_images
+    count = min(limit, len(images) // per_request)
+    headers = {"content-type": FORMATS[fmt]}
+    return [
+        (
+            ROUTES[route],
+            _encode(images[i * per_request:(i + 1) * per_request], fmt, route == "predict"),
+            headers,
+        )
+        for i in range(count)
+    ]
+
+
+def capture_payloads(path, default_path, limit):
+    """(path, body, headers) requests replayed from a JSON-lines capture."""
+    payloads = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if "json" in rec:
+                body, content_type = json.dumps(rec["json"]).encode(), JSON
+            else:
+                body = base64.b64decode(rec["body_b64"])
+                content_type = rec.get("content_type", OCTET_STREAM)
+            payloads.append(
+                (rec.get("path", default_path), body, {"content-type": content_type})
+            )
+            if len(payloads) >= limit:
+                break
+    if not payloads:
+        raise SystemExit(f"❌ no requests in capture {path}")
+    return payloads
+
+
+class Recorder:
+    """Per-level results: latencies, status codes and client-side errors."""
+
+    def __init__(self):
+        self.raw_ms = []
+        self.corrected_ms = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        # open loop: how far the generator itself fell behind its schedule
+        self.max_dispatch_lag_ms = 0.0
+
+    def record(self, status, raw_ms, corrected_ms):
+        self.statuses[status] += 1
+        self.raw_ms.append(raw_ms)
+        self.corrected_ms.append(corrected_ms)
+
+    @property
+    def total(self):
+        return sum(self.statuses.values()) + sum(self.errors.values())
+
+    @property
+    def failed(self):
+        bad_status = sum(n for status, n in self.statuses.items() if status >= 400)
+        return bad_status + sum(self.errors.values())
+
+
+async def _send(client, payload, recorder, scheduled):
+    path, body, headers = payload
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        response = await client.post(path, content=body, headers=headers)
+    except httpx.HTTPError as exc:
+        recorder.errors[type(exc).__name__] += 1
+        return
+    done = loop.time()
+    recorder.record(response.status_code, (done - started) * 1000, (done - scheduled) * 1000)
+
+
+async def closed_loop(client, payloads, concurrency, duration_s, recorder):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration_s
+
+    async def worker(offset):
+        i = offset
+        while loop.time() < deadline:
+            await _send(client, payloads[i % len(payloads)], recorder, loop.time())
+            i += concurrency
+
+    await asyncio.gather(*(worker(k) for k in range(concurrency)))
+
+
+async def open_loop(client, payloads, rate, duration_s, recorder, poisson, rng):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    scheduled, i, tasks = started, 0, []
+    while scheduled < started + duration_s:
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            recorder.max_dispatch_lag_ms = max(recorder.max_dispatch_lag_ms, -delay * 1000)
+        tasks.append(asyncio.create_task(
+            _send(client, payloads[i % len(payloads)], recorder, scheduled)
+        ))
+        i += 1
+        scheduled += rng.exponential(1 / rate) if poisson else 1 / rate
+    await asyncio.gather(*tasks)
+
+
+def _with_expected_interval(values_ms, interval_ms):
+    """HdrHistogram-style backfill for requests a stalled closed-loop client never sent."""
+    values = np.asarray(values_ms, dtype=np.float64)
+    if interval_ms <= 0 or not len(values):
+        return values
+    # v - interval, v - 2 * interval, ... while still >= interval
+    missing = np.maximum(np.floor(values / interval_ms).astype(np.int64) - 1, 0)
+    owners = np.repeat(values, missing)
+    steps = np.concatenate([np.arange(1, k + 1) for k in missing[missing > 0]] or [[]])
+    return np.concatenate([values, owners - steps * interval_ms])
+
+
+def _latency_summary(values_ms):
+    arr = np.asarray(values_ms, dtype=np.float64)
+    if not len(arr):
+        return {"count": 0}, []
+    points = np.percentile(arr, list(PERCENTILES.values()))
+    summary = {"count": int(len(arr))}
+    summary.update({name: float(v) for name, v in zip(PERCENTILES, points)})
+    summary.update(mean=float(arr.mean()), max=float(arr.max()))
+
+    counts = np.bincount(
+        np.searchsorted(HISTOGRAM_EDGES_MS, arr), minlength=len(HISTOGRAM_EDGES_MS) + 1
+    )
+    edges = list(HISTOGRAM_EDGES_MS) + [float("inf")]
+    histogram = [
+        {"le_ms": float(edges[i]), "count": int(c)} for i, c in enumerate(counts) if c
+    ]
+    return summary, histogram
+
+
+def summarize(recorder, level, elapsed_s, images_per_request, expected_interval_ms=None):
+    if level["mode"] == "closed":
+        interval = expected_interval_ms
+        if interval is None:
+            interval = float(np.median(recorder.raw_ms)) if recorder.raw_ms else 0.0
+        corrected = _with_expected_interval(recorder.raw_ms, interval)
+        level = dict(level, expected_interval_ms=interval)
+    else:
+        corrected = recorder.corrected_ms
+        level = dict(level, max_dispatch_lag_ms=recorder.max_dispatch_lag_ms)
+
+    raw, raw_hist = _latency_summary(recorder.raw_ms)
+    fixed, fixed_hist = _latency_summary(corrected)
+    completed = sum(recorder.statuses.values())
+    ok = sum(n for status, n in recorder.statuses.items() if status < 400)
+    return {
+        **level,
+        "elapsed_s": elapsed_s,
+        "requests": recorder.total,
+        "completed": completed,
+        "throughput_rps": completed / elapsed_s,
+        "ok_images_per_s": ok * images_per_request / elapsed_s,
+        "error_rate": recorder.failed / recorder.total if recorder.total else 0.0,
+        "statuses": {str(k): v for k, v in sorted(recorder.statuses.items())},
+        "errors": dict(recorder.errors),
+        "latency_ms": {"raw": raw, "corrected": fixed},
+        "histogram_ms": {"raw": raw_hist, "corrected": fixed_hist},
+    }
+
+
+async def run(args, base_url, payloads):
+    limits = httpx.Limits(
+        max_connections=args.connections, max_keepalive_connections=args.connections
+    )
+    timeout = httpx.Timeout(args.timeout_s)
+    images_per_request = 1 if args.route == "predict" else args.batch_images
+    rng = np.random.default_rng(args.seed)
+
+    levels = [{"mode": "closed", "concurrency": c} for c in args.concurrency]
+    levels += [{"mode": "open", "rate_rps": r, "arrivals": args.arrivals} for r in args.rate]
+
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        if args.warmup_s > 0:
+            await closed_loop(client, payloads, 4, args.warmup_s, Recorder())
+
+        for level in levels:
+            recorder = Recorder()
+            started = time.perf_counter()
+            if level["mode"] == "closed":
+                await closed_loop(
+                    client, payloads, level["concurrency"], args.duration_s, recorder
+                )
+            else:
+                await open_loop(
+                    client, payloads, level["rate_rps"], args.duration_s, recorder,
+                    args.arrivals == "poisson", rng,
+                )
+            result = summarize(
+                recorder, level, time.perf_counter() - started, images_per_request,
+                args.expected_interval_ms,
+            )
+            results.append(result)
+
+            label = (
+                f"c={level['concurrency']}" if level["mode"] == "closed"
+                else f"rate={level['rate_rps']}/s"
+            )
+            lat = result["latency_ms"]["corrected"]
+            print(
+                f"{label}: {result['throughput_rps']:.0f} req/s, "
+                f"p50 {lat.get('p50', 0):.1f} ms, p99 {lat.get('p99', 0):.1f} ms, "
+                f"errors {result['error_rate']:.2%}",
+                file=sys.stderr,
+            )
+    return results
+
+
+@contextmanager
+def local_server(port, workers, startup_timeout_s=60):
+    """Run ml-api on 127.0.0.1:<port> for the duration of the load test."""
+    if workers:
+        cmd = [sys.executable, "-m", "api.serve", "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ML_API_DIR)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout_s
+        while True:
+            if proc.poll() is not None:
+                raise SystemExit(f"❌ server exited with code {proc.returncode}")
+            # /ready, not /health: measure the warmed-up model, not its loading
+            try:
+                status = httpx.get(f"{url}/ready", timeout=1).status_code
+            except httpx.HTTPError:
+                status = None  # not listening yet
+            if status == 200:
+                break
+            if status not in (None, 503):
+                raise SystemExit(f"❌ server answered /ready with HTTP {status}")
+            if time.monotonic() > deadline:
+                raise SystemExit(f"❌ server did not become ready in {startup_timeout_s}s")
+            time.sleep(0.2)
+        yield url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _number_list(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test ml-api over HTTP")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn-server", action="store_true",
+                        help="start ml-api locally from this checkout instead of using --url")
+    parser.add_argument("--server-port", type=int, default=8765)
+    parser.add_argument("--server-workers", type=int, default=0,
+                        help="0 = single uvicorn process, N = python -m api.serve --workers N")
+    parser.add_argument("--route", choices=sorted(ROUTES), default="predict")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="octet")
+    parser.add_argument("--batch-images", type=int, default=16,
+                        help="images per /mnist/predict_batch request")
+    parser.add_argument("--capture", help="JSON-lines capture to replay instead of MNIST")
+    parser.add_argument("--max-payloads", type=int, default=10000)
+    parser.add_argument("--concurrency", type=_number_list(int), default=[],
+                        help="closed-loop levels, e.g. 1,8,32")
+    parser.add_argument("--rate", type=_number_list(float), default=[],
+                        help="open-loop arrival rates in req/s, e.g. 100,500")
+    parser.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--duration-s", type=float, default=10)
+    parser.add_argument("--warmup-s", type=float, default=2)
+    parser.add_argument("--expected-interval-ms", type=float,
+                        help="closed-loop coordinated-omission interval (default: raw p50)")
+    parser.add_argument("--connections", type=int, default=256)
+    parser.add_argument("--timeout-s", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if not args.concurrency and not args.rate:
+        args.concurrency = [1, 8, 32]
+
+    if args.capture:
+        payloads = capture_payloads(args.capture, ROUTES[args.route], args.max_payloads)
+    else:
+        payloads = mnist_payloads(args.route, args.format, args.batch_images, args.max_payloads)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "route": args.route,
+        "source": args.capture or f"mnist:test:{args.format}",
+        "distinct_payloads": len(payloads),
+        "duration_s": args.duration_s,
+        "connections": args.connections,
+    }
+    if args.spawn_server:
+        report["server"] = {
+            "workers": args.server_workers,
+            "env": {k: os.environ[k] for k in ("INFERENCE_ENGINE", "CACHE_ENABLED",
+                                               "BATCH_ENABLED", "INFERENCE_WORKERS")
+                    if k in os.environ},
+        }
+        with local_server(args.server_port, args.server_workers) as url:
+            report["url"] = url
+            report["levels"] = asyncio.run(run(args, url, payloads))
+    else:
+        report["url"] = args.url
+        report["levels"] = asyncio.run(run(args, args.url, payloads))
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,563 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Annotated, ClassVar, Literal
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field, ValidationError
 import numpy as np
-from api.mnist import predict_from_array
+from api.admin import require_admin
+from api.batching import MicroBatcher
+from api.cache import PredictionCache
+from api.codecs import (
+    IMAGE_SIZE,
+    JSON,
+    NPY,
+    OCTET_STREAM,
+    PayloadError,
+    UnsupportedMediaType,
+    decode_images,
+    decode_json,
+    media_type,
+)
+from api.config import (
+    BATCH_ENABLED,
+    BATCH_MAX_SIZE,
+    BATCH_MAX_WAIT_MS,
+    CACHE_ENABLED,
+    CACHE_MAX_BYTES,
+    CACHE_TTL_S,
+    INFERENCE_ENGINE,
+    INFERENCE_MAX_PENDING,
+    INFERENCE_RETRY_AFTER_S,
+    INFERENCE_WORKERS,
+    JSON_FAST_PATH,
+    MODEL_RESCAN_MIN_INTERVAL_S,
+    PREDICT_BATCH_MAX_IMAGES,
+    PROFILE_DIR,
+    PROFILE_MAX_SECONDS,
+    TORCH_INTEROP_THREADS,
+    TORCH_INTRA_OP_THREADS,
+    WARMUP_BATCH_SIZES,
+    WARMUP_ENABLED,
+    WARMUP_ROUNDS,
+)
+from api.engines import TORCH_ENGINES
+from api.executor import InferenceExecutor, Overloaded
+from api.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    REQUEST_SECONDS,
+    REQUESTS,
+    STAGE_SECONDS,
+    MetricsMiddleware,
+    StageClock,
+    counter,
+    gauge,
+    histogram_from_counts,
+    process_metrics,
+    render,
+)
+from api.mnist import REGISTRY, predict_from_array, predict_batch_from_array
+from api.profiling import ProfileBusy, Profiler
+from api.registry import UnknownModelVersion
+from api.warmup import Readiness, default_batch_sizes, run_batches
+from api.responses import (
+    FULL,
+    FastJSONResponse,
+    batch_prediction_body,
+    prediction_body,
+)
+
+executor = InferenceExecutor(
+    workers=INFERENCE_WORKERS,
+    intra_op_threads=TORCH_INTRA_OP_THREADS,
+    interop_threads=TORCH_INTEROP_THREADS,
+    max_pending=INFERENCE_MAX_PENDING,
+    retry_after_s=INFERENCE_RETRY_AFTER_S,
+    # torch is never imported when a torch-free engine is selected
+    configure_torch=INFERENCE_ENGINE in TORCH_ENGINES,
+)
+
+batcher = MicroBatcher(
+    predict_batch_from_array,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    run=executor.run,
+    max_concurrent_batches=INFERENCE_WORKERS,
+)
+
+cache = PredictionCache(CACHE_MAX_BYTES, CACHE_TTL_S) if CACHE_ENABLED else None
+
+profiler = Profiler(
+    executor,
+    PROFILE_DIR,
+    max_seconds=PROFILE_MAX_SECONDS,
+    use_torch=INFERENCE_ENGINE in TORCH_ENGINES,
+)
+
+
+def _invalidate_swapped_version(old_version, new_version):
+    if old_version != new_version:
+        cache.invalidate(old_version)
+
+
+if cache is not None:
+    REGISTRY.add_swap_listener(_invalidate_swapped_version)
+
+
+if not WARMUP_ENABLED:
+    warmup_batch_sizes = []
+else:
+    warmup_batch_sizes = WARMUP_BATCH_SIZES or default_batch_sizes(BATCH_MAX_SIZE)
+
+readiness = Readiness(import_s=time.perf_counter() - _import_started)
+
+
+async def _warm_up():
+    await readiness.warm_up(
+        executor, REGISTRY, predict_batch_from_array, warmup_batch_sizes, WARMUP_ROUNDS
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor.start()
+    if BATCH_ENABLED:
+        await batcher.start()
+    # Serve /health right away; /ready flips once warmup is done
+    warmup = asyncio.create_task(_warm_up())
+    yield
+    warmup.cancel()
+    await profiler.stop("shutdown")
+    await batcher.stop()
+    executor.shutdown()
+
+
+app = FastAPI(
+    title="MNIST Inference API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return FastJSONResponse(
+        {"detail": str(exc)},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
 
-app = FastAPI(title="MNIST Inference API")
+@app.exception_handler(UnknownModelVersion)
+async def unknown_version_handler(request: Request, exc: UnknownModelVersion):
+    return FastJSONResponse(
+        {"detail": f"unknown model version {exc.args[0]!r}"},
+        status_code=404,
+    )
+
+
+Pixels = Annotated[list[float], Field(min_length=IMAGE_SIZE, max_length=IMAGE_SIZE)]
 
 
 class MNISTRequest(BaseModel):
-    pixels: list  # 784 values
+    json_field: ClassVar[str] = "pixels"
+
+    pixels: Pixels
+
+    def to_array(self):
+        return np.array(self.pixels, dtype=np.float32).reshape(1, 28, 28)
 
 
 class MNISTResponse(BaseModel):
+    model_version: str
     predicted_label: int
-    probabilities: dict
+    probabilities: dict[str, float] | list[float] | None = None  # full / compact
+    top_k: dict | None = None  # {"labels": [...], "probabilities": [...]}
+
+
+class MNISTBatchRequest(BaseModel):
+    json_field: ClassVar[str] = "images"
+
+    images: list[Pixels]
+
+    def to_array(self):
+        return np.array(self.images, dtype=np.float32).reshape(len(self.images), 28, 28)
+
+
+class MNISTBatchResponse(BaseModel):
+    model_version: str
+    predicted_labels: list[int]
+    probabilities: list[list[float]] | None = None  # N x 10
+    top_k: dict | None = None
+
+
+def _body_formats(json_model):
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                JSON: {"schema": json_model.model_json_schema()},
+                OCTET_STREAM: binary,
+                NPY: binary,
+            },
+        }
+    }
+
+
+async def _read_images(request: Request, json_model, max_images):
+    """
+    Decode the body into an (N, 28, 28) array according to Content-Type.
+
+    Binary bodies are wrapped with np.frombuffer. JSON goes through
+    orjson + numpy (JSON_FAST_PATH) or full pydantic validation.
+    """
+    clock = StageClock()
+    body = await request.body()
+    clock.lap("receive")
+    content_type = request.headers.get("content-type")
+
+    try:
+        if media_type(content_type) != JSON:
+            arr = decode_images(body, content_type)
+        elif JSON_FAST_PATH:
+            arr = decode_json(body, json_model.json_field)
+        else:
+            arr = json_model.model_validate_json(body).to_array()
+    except UnsupportedMediaType as exc:
+        raise HTTPException(status_code=415, detail=str(exc))
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors())
+    except (PayloadError, ValueError, TypeError) as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    clock.lap("parse")
+
+    if not 1 <= len(arr) <= max_images:
+        raise HTTPException(
+            status_code=422,
+            detail=f"expected 1..{max_images} images, got {len(arr)}",
+        )
+    return arr
+
+
+ResponseFormat = Annotated[
+    Literal["full", "compact"],
+    Query(alias="format", description="full: label->prob dict, compact: array"),
+]
+ModelVersion = Annotated[
+    str | None,
+    Query(description="pin a model version; the registry default if omitted"),
+]
+TopK = Annotated[
+    int | None,
+    Query(ge=1, le=10, description="return only the k most likely labels"),
+]
+UseCache = Annotated[
+    bool,
+    Query(alias="cache", description="false: bypass the prediction cache (bulk scoring)"),
+]
+
 
+_rescan_lock = asyncio.Lock()
 
-@app.post("/mnist/predict", response_model=MNISTResponse)
-def mnist_predict(req: MNISTRequest):
-    arr = np.array(req.pixels).reshape(28, 28)
 
-    pred, probs = predict_from_array(arr)
+async def _rescan_for(version):
+    """
+    Pick up checkpoints added since startup for an unknown ``version``.
 
+    Concurrent misses share one scan and scans are at least
+    MODEL_RESCAN_MIN_INTERVAL_S apart, so a stream of bogus versions
+    cannot keep the disk busy; the scan runs on a plain thread, never on
+    the inference executor.
+    """
+    async with _rescan_lock:
+        if REGISTRY.has_version(version):
+            return
+        if time.monotonic() - REGISTRY.scanned_at < MODEL_RESCAN_MIN_INTERVAL_S:
+            return
+        await asyncio.to_thread(REGISTRY.scan)
+
+
+async def _resolve_model(version):
+    """Registry handle for ``version``; first use loads it off the event loop."""
+    if REGISTRY.is_loaded(version):
+        return REGISTRY.get(version)
+    if version is None:
+        if REGISTRY.default_version is None:
+            raise UnknownModelVersion("no model versions found")
+        return await executor.run(REGISTRY.get)
+    if not REGISTRY.has_version(version):
+        await _rescan_for(version)
+        if not REGISTRY.has_version(version):
+            raise UnknownModelVersion(version)
+    return await executor.run(REGISTRY.get, version)
+
+
+async def _predict_batch_cached(arr, handle):
+    """Serve cached images from the cache, run one forward for the rest."""
+    keys = [cache.key(img, handle.version) for img in arr]
+    hits = [cache.get(k) for k in keys]
+    miss_idx = [i for i, hit in enumerate(hits) if hit is None]
+
+    preds = np.empty(len(arr), dtype=np.int64)
+    probs = np.empty((len(arr), 10), dtype=np.float32)
+    for i, hit in enumerate(hits):
+        if hit is not None:
+            preds[i], probs[i] = hit
+
+    if miss_idx:
+        miss_preds, miss_probs = await executor.run(
+            predict_batch_from_array, arr[miss_idx], handle.model
+        )
+        preds[miss_idx] = miss_preds
+        probs[miss_idx] = miss_probs
+        for j, i in enumerate(miss_idx):
+            cache.put(keys[i], handle.version, miss_preds[j], miss_probs[j])
+
+    return preds, probs
+
+
+def _timed_response(body, started, decoded, inferred):
+    """Serialize the body and report per-stage durations in Server-Timing."""
+    response = FastJSONResponse(body)
+    finished = time.perf_counter()
+    STAGE_SECONDS.observe(finished - inferred, "serialize")
+    response.headers["Server-Timing"] = ", ".join(
+        f"{name};dur={(end - start) * 1000.0:.3f}"
+        for name, start, end in (
+            ("decode", started, decoded),
+            ("infer", decoded, inferred),
+            ("serialize", inferred, finished),
+        )
+    )
+    return response
+
+
+@app.post(
+    "/mnist/predict",
+    response_model=MNISTResponse,
+    openapi_extra=_body_formats(MNISTRequest),
+)
+async def mnist_predict(
+        request: Request,
+        response_format: ResponseFormat = FULL,
+        top_k: TopK = None,
+        version: ModelVersion = None,
+):
+    with executor.admit():
+        started = time.perf_counter()
+        arr = (await _read_images(request, MNISTRequest, max_images=1))[0]
+        handle = await _resolve_model(version)
+        decoded = time.perf_counter()
+
+        key = cached = None
+        if cache is not None:
+            key = cache.key(arr, handle.version)
+            cached = cache.get(key)
+
+        if cached is not None:
+            pred, probs = cached
+        elif batcher.running:
+            pred, probs = await batcher.submit(arr, handle.model)
+        else:
+            pred, probs = await executor.run(predict_from_array, arr, handle.model)
+
+        if cache is not None and cached is None:
+            cache.put(key, handle.version, pred, probs)
+        inferred = time.perf_counter()
+
+    body = prediction_body(pred, probs, shape=response_format, top_k=top_k)
+    body["model_version"] = handle.version
+    response = _timed_response(body, started, decoded, inferred)
+    profiler.request_done()
+    return response
+
+
+@app.post(
+    "/mnist/predict_batch",
+    response_model=MNISTBatchResponse,
+    openapi_extra=_body_formats(MNISTBatchRequest),
+)
+async def mnist_predict_batch(
+        request: Request,
+        top_k: TopK = None,
+        version: ModelVersion = None,
+        use_cache: UseCache = True,
+):
+    with executor.admit():
+        started = time.perf_counter()
+        arr = await _read_images(
+            request, MNISTBatchRequest, max_images=PREDICT_BATCH_MAX_IMAGES
+        )
+        handle = await _resolve_model(version)
+        decoded = time.perf_counter()
+
+        if cache is None or not use_cache:
+            preds, probs = await executor.run(
+                predict_batch_from_array, arr, handle.model
+            )
+        else:
+            preds, probs = await _predict_batch_cached(arr, handle)
+        inferred = time.perf_counter()
+
+    body = batch_prediction_body(preds, probs, top_k=top_k)
+    body["model_version"] = handle.version
+    response = _timed_response(body, started, decoded, inferred)
+    profiler.request_done()
+    return response
+
+
+@app.get("/mnist/batching/stats")
+def batching_stats():
     return {
-        "predicted_label": pred,
-        "probabilities": {str(i): float(probs[i]) for i in range(10)},
+        "enabled": batcher.running,
+        "max_batch_size": batcher.max_batch_size,
+        "max_wait_ms": batcher.max_wait * 1000.0,
+        "queue_depth": batcher.queue_depth,
+        **batcher.stats.snapshot(),
     }
 
 
+@app.get("/mnist/executor/stats")
+def executor_stats():
+    return executor.snapshot()
+
+
+@app.get("/mnist/cache/stats")
+def cache_stats():
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.snapshot()}
+
+
+@app.delete("/admin/cache", dependencies=[Depends(require_admin)])
+def clear_cache():
+    return {"dropped": cache.invalidate() if cache is not None else 0}
+
+
+class DefaultVersionRequest(BaseModel):
+    version: str
+
+
+@app.get("/mnist/models")
+def list_models():
+    return REGISTRY.snapshot()
+
+
+@app.put("/admin/models/default", dependencies=[Depends(require_admin)])
+async def set_default_model(req: DefaultVersionRequest):
+    # Loads and warms the new version first; in-flight requests keep their handle
+    handle = await executor.run(REGISTRY.load, req.version)
+    if warmup_batch_sizes:
+        await executor.run_on_each_worker(
+            lambda: run_batches(
+                predict_batch_from_array, handle.model, warmup_batch_sizes, WARMUP_ROUNDS
+            )
+        )
+    handle = await executor.run(REGISTRY.set_default, req.version)
+    return {"default_version": handle.version, "load_s": handle.load_s}
+
+
+class ProfileRequest(BaseModel):
+    requests: int | None = Field(None, ge=1, description="stop after N predict requests")
+    seconds: float | None = Field(None, gt=0, description="stop after T seconds")
+    sample_interval_ms: float = Field(5.0, ge=1, le=1000)
+
+
+@app.post("/admin/profile", status_code=202, dependencies=[Depends(require_admin)])
+async def start_profile(req: ProfileRequest):
+    # Stops at whichever limit comes first; PROFILE_MAX_SECONDS always applies
+    try:
+        return await profiler.start(req.requests, req.seconds, req.sample_interval_ms)
+    except ProfileBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+def profile_status():
+    return profiler.snapshot()
+
+
+@app.delete("/admin/profile", dependencies=[Depends(require_admin)])
+async def stop_profile():
+    meta = await profiler.stop()
+    if meta is None:
+        raise HTTPException(status_code=409, detail="no profile capture is running")
+    return meta
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format; see api.metrics."""
+    batching = batcher.stats
+    registry = REGISTRY.snapshot()
+    default_version = registry["default_version"]
+    families = [
+        STAGE_SECONDS.render(),
+        REQUEST_SECONDS.render(),
+        REQUESTS.render(),
+        gauge("mlapi_ready", "1 once warmup has finished.", int(readiness.ready)),
+        gauge(
+            "mlapi_inflight_requests", "Requests admitted and not finished.",
+            executor.pending,
+        ),
+        counter(
+            "mlapi_rejected_requests_total", "Requests rejected with 429.",
+            executor.rejected,
+        ),
+        gauge(
+            "mlapi_batch_queue_depth", "Images waiting for the micro-batcher.",
+            batcher.queue_depth,
+        ),
+        histogram_from_counts(
+            "mlapi_batch_size", "Images per micro-batched forward pass.",
+            dict(batching.batch_sizes),
+        ),
+        counter(
+            "mlapi_batch_errors_total", "Micro-batches whose forward pass failed.",
+            batching.errors,
+        ),
+        gauge(
+            "mlapi_model_info", "Loaded model versions (value 1) by engine.",
+            {
+                (v["version"], v["engine"], str(v["version"] == default_version).lower()): 1
+                for v in registry["versions"] if v["loaded"]
+            },
+            labelnames=("version", "engine", "default"),
+        ),
+        counter("mlapi_model_swaps_total", "Default model swaps.", registry["swaps"]),
+    ]
+    if cache is not None:
+        stats = cache.snapshot()
+        families += [
+            counter(
+                "mlapi_cache_lookups_total", "Prediction cache lookups by result.",
+                {
+                    ("hit",): stats["hits"],
+                    ("miss",): stats["misses"],
+                    ("bypass",): stats["bypassed"],
+                },
+                labelnames=("result",),
+            ),
+            gauge("mlapi_cache_bytes", "Prediction cache size in bytes.", stats["bytes"]),
+        ]
+    families += process_metrics()
+    return Response(render(families), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the default model is loaded and warmed up."""
+    return FastJSONResponse(
+        readiness.snapshot(), status_code=200 if readiness.ready else 503
+    )
+
+
 @app.get("/health")
 def health():
     return {
@@ -0,0 +1,262 @@
+"""
+Prometheus text-format metrics for ml-api (GET /metrics).
+
+Hot-path recording is one bisect plus a few integer adds under a lock, with
+no allocation, so the metrics stay on in production. Everything that is
+already tracked elsewhere (queue depth, in-flight requests, batch sizes,
+cache counters, loaded models, RSS) is read at scrape time instead.
+
+Under api.serve every worker process keeps its own metrics; a scrape
+through the shared port reaches one of them.
+"""
+import os
+import resource
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 25us .. 10s
+LATENCY_BUCKETS_S = (
+    0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+_PROCESS_STARTED = time.time()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _header(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _histogram_lines(name, labelnames, labelvalues, buckets, counts, total, count):
+    lines = []
+    cumulative = 0
+    for le, n in zip((*buckets, float("inf")), counts):
+        cumulative += n
+        le_label = (("le", _number(float(le))),)
+        lines.append(f"{name}_bucket{_labels(labelnames, labelvalues, le_label)} {cumulative}")
+    labels = _labels(labelnames, labelvalues)
+    lines.append(f"{name}_sum{labels} {_number(float(total))}")
+    lines.append(f"{name}_count{labels} {count}")
+    return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram, safe to observe from executor threads."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS_S):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 3)
+            series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        lines = _header(self.name, "histogram", self.help)
+        for labelvalues, values in sorted(series.items()):
+            lines += _histogram_lines(
+                self.name, self.labelnames, labelvalues, self.buckets,
+                values[:-2], values[-2], values[-1],
+            )
+        return "\n".join(lines)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = _header(self.name, "counter", self.help)
+        lines += [
+            f"{self.name}{_labels(self.labelnames, k)} {_number(v)}"
+            for k, v in sorted(values.items())
+        ]
+        return "\n".join(lines)
+
+
+def gauge(name, help_text, value, labelnames=(), kind="gauge"):
+    """Scrape-time family: ``value`` is a number or {label values: number}."""
+    samples = value if isinstance(value, dict) else {(): value}
+    lines = _header(name, kind, help_text)
+    lines += [
+        f"{name}{_labels(labelnames, k)} {_number(v)}" for k, v in samples.items()
+    ]
+    return "\n".join(lines)
+
+
+def counter(name, help_text, value, labelnames=()):
+    return gauge(name, help_text, value, labelnames, kind="counter")
+
+
+def histogram_from_counts(name, help_text, counts_by_value, buckets=BATCH_SIZE_BUCKETS):
+    """Histogram family from exact {value: occurrences} counts kept elsewhere."""
+    bucket_counts = [0] * (len(buckets) + 1)
+    for value, n in counts_by_value.items():
+        bucket_counts[bisect_left(buckets, value)] += n
+    total = sum(value * n for value, n in counts_by_value.items())
+    count = sum(counts_by_value.values())
+    lines = _header(name, "histogram", help_text)
+    lines += _histogram_lines(name, (), (), buckets, bucket_counts, total, count)
+    return "\n".join(lines)
+
+
+def _resident_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def process_metrics():
+    families = []
+    rss = _resident_bytes()
+    if rss is not None:
+        families.append(gauge(
+            "process_resident_memory_bytes", "Resident memory size in bytes.", rss
+        ))
+    # ru_maxrss is in KiB on Linux
+    families.append(gauge(
+        "process_peak_resident_memory_bytes", "Peak resident memory size in bytes.",
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    ))
+    families.append(gauge(
+        "process_start_time_seconds", "Start time of the process since unix epoch.",
+        _PROCESS_STARTED,
+    ))
+    return families
+
+
+def render(families):
+    return "\n".join(families) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "mlapi_stage_duration_seconds",
+    "Time spent per request stage "
+    "(receive, parse, queue_wait, tensor_build, forward, softmax, serialize).",
+    labelnames=("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "mlapi_request_duration_seconds",
+    "End-to-end request latency inside the service.",
+    labelnames=("method", "route"),
+)
+REQUESTS = Counter(
+    "mlapi_requests_total", "Requests by route and status code.",
+    labelnames=("method", "route", "status"),
+)
+
+
+_stage_local = threading.local()
+
+
+@contextmanager
+def stage_timings_paused():
+    """Drop StageClock laps on this thread, e.g. for synthetic warmup calls."""
+    _stage_local.paused = True
+    try:
+        yield
+    finally:
+        _stage_local.paused = False
+
+
+class StageClock:
+    """
+    Records consecutive stages of one call into STAGE_SECONDS:
+
+        clock = StageClock()
+        x = build(arr)
+        clock.lap("tensor_build")
+        y = model(x)
+        clock.lap("forward")
+
+    Laps inside ``stage_timings_paused()`` are not recorded.
+    """
+
+    __slots__ = ("_last",)
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        if not getattr(_stage_local, "paused", False):
+            STAGE_SECONDS.observe(now - self._last, stage)
+        self._last = now
+        return now
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and their latency per matched route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Route templates, not raw paths, keep the label set bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_SECONDS.observe(time.perf_counter() - started, method, route)
+            REQUESTS.inc(method, route, str(status))
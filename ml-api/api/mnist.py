@@ -1,48 +1,42 @@
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-import numpy as np
-
+import os
 
-class SmallCNN(nn.Module):
-    def __init__(self):
-        super().__init__()
-        self.net = nn.Sequential(
-            nn.Conv2d(1, 16, 3, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(2),
-
-            nn.Conv2d(16, 32, 3, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(2),
+import numpy as np
 
-            nn.Flatten(),
+from api.config import INFERENCE_ENGINE, MODEL_DEFAULT_VERSION, MODEL_PATH
+from api.engines import load_engine
+from api.profiling import span
+from api.registry import ModelRegistry
 
-            nn.Linear(32 * 7 * 7, 128),
-            nn.ReLU(),
 
-            nn.Linear(128, 10)
-        )
+# .pth: fp32 checkpoints, served by INFERENCE_ENGINE
+# .ts: TorchScript variants (e.g. int8 from api.quantize), always served by torch
+CHECKPOINT_SUFFIX = ".pth"
+TORCHSCRIPT_SUFFIX = ".ts"
 
-    def forward(self, x):
-        return self.net(x)
 
+def _load_version(version, path):
+    if path.suffix == TORCHSCRIPT_SUFFIX:
+        return load_engine("torch", version, path)
+    return load_engine(INFERENCE_ENGINE, version, path)
 
-def load_model(path="models/mnist/mnist_cnn.pth"):
-    ckpt = torch.load(path, map_location="cpu")
-    model = SmallCNN()
-    model.load_state_dict(ckpt["state_dict"])
-    model.eval()
-    return model
 
+# Checkpoints are loaded lazily, on the first request for each version
+REGISTRY = ModelRegistry(
+    os.path.join(MODEL_PATH, "mnist"),
+    _load_version,
+    suffixes=(CHECKPOINT_SUFFIX, TORCHSCRIPT_SUFFIX),
+    default_version=MODEL_DEFAULT_VERSION,
+)
 
-MODEL = load_model()
 
+def predict_from_array(arr_28x28: np.ndarray, model=None):
+    preds, probs = predict_batch_from_array(arr_28x28[np.newaxis], model)
+    return int(preds[0]), probs[0]
 
-def predict_from_array(arr_28x28: np.ndarray):
-    x = torch.from_numpy(arr_28x28).float().unsqueeze(0).unsqueeze(0) / 255.0
-    with torch.no_grad():
-        logits = MODEL(x)
-        probs = F.softmax(logits, dim=1).squeeze(0).numpy()
 
-    return int(probs.argmax()), probs
+def predict_batch_from_array(arr_nx28x28: np.ndarray, model=None):
+    """``model`` is an engine from ``api.engines``; the registry default if None."""
+    if model is None:
+        model = REGISTRY.get().model
+    with span("predict_batch_from_array"):
+        return model.predict_batch(arr_nx28x28)
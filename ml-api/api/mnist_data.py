@@ -0,0 +1,55 @@
+import gzip
+from pathlib import Path
+
+import numpy as np
+
+from api.config import MNIST_DATA_DIR
+
+# idx type codes (http://yann.lecun.com/exdb/mnist/): only uint8 is used by MNIST
+_IDX_DTYPES = {0x08: np.uint8}
+
+_SPLIT_PREFIX = {"train": "train", "test": "t10k"}
+
+
+# Source of truth for idx parsing; db/build_mnist_db.py keeps a copy (it
+# only sees web-app's utils), keep the two in sync
+def read_idx(path):
+    """Parse an idx file (optionally gzipped) into a uint8 ndarray."""
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rb") as f:
+        data = f.read()
+
+    if data[0] != 0 or data[1] != 0 or data[2] not in _IDX_DTYPES:
+        raise ValueError(f"{path} is not a uint8 idx file")
+    ndim = data[3]
+    dims = np.frombuffer(data, dtype=">i4", count=ndim, offset=4)
+    return np.frombuffer(
+        data, dtype=_IDX_DTYPES[data[2]], offset=4 + 4 * ndim
+    ).reshape(tuple(int(d) for d in dims))
+
+
+def _find(root, name):
+    for candidate in (root / name, root / f"{name}.gz"):
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(f"{name}[.gz] not found in {root}")
+
+
+def has_split(split, root=MNIST_DATA_DIR):
+    try:
+        _find(Path(root), f"{_SPLIT_PREFIX[split]}-images-idx3-ubyte")
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def load_split(split="test", root=MNIST_DATA_DIR):
+    """Images (N, 28, 28) uint8 and labels (N,) uint8 of the train/test split."""
+    root = Path(root)
+    prefix = _SPLIT_PREFIX[split]
+    images = read_idx(_find(root, f"{prefix}-images-idx3-ubyte"))
+    labels = read_idx(_find(root, f"{prefix}-labels-idx1-ubyte"))
+    if len(images) != len(labels):
+        raise ValueError(f"{split}: {len(images)} images but {len(labels)} labels")
+    return images, labels
@@ -0,0 +1,244 @@
+"""
+On-demand profiling of live traffic (POST /admin/profile).
+
+A capture covers the next N predict requests or T seconds, whichever
+comes first. It then switches itself off and writes to PROFILE_DIR/<id>/:
+
+- torch_trace.json: torch.profiler Chrome trace (chrome://tracing, Perfetto)
+- torch_ops.txt: op table per inference worker, sorted by self CPU time
+- python_stacks.folded: sampled Python stacks of every thread, in the
+  folded format read by flamegraph.pl and speedscope
+- capture.json: parameters, stop reason and counters
+
+torch.profiler only records the thread it was started on, so it is
+started and stopped on each inference worker
+(``InferenceExecutor.run_on_each_worker``), which is where forward
+passes run. Engines that do not run in torch only get the stack sampler.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from functools import partial
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Set while a capture with torch.profiler is running; read on the hot path
+_torch_active = False
+_local = threading.local()
+
+
+class ProfileBusy(RuntimeError):
+    """A capture is already running (HTTP 409)."""
+
+
+def span(name):
+    """Named range in the torch trace while a capture runs; no-op otherwise."""
+    if not _torch_active:
+        return nullcontext()
+    from torch.autograd.profiler import record_function
+
+    return record_function(name)
+
+
+class StackSampler(threading.Thread):
+    """Samples the Python stack of every other thread at a fixed interval."""
+
+    def __init__(self, interval_s):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval_s = interval_s
+        self.samples = 0
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def folded(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def _start_torch_profiler():
+    from torch.profiler import ProfilerActivity, profile
+
+    prof = profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+    prof.start()
+    _local.profiler = prof
+
+
+def _stop_torch_profiler(out_dir):
+    prof = _local.__dict__.pop("profiler", None)
+    if prof is None:
+        return None
+    prof.stop()
+    thread = threading.current_thread().name
+    trace_path = out_dir / f"torch_trace.{thread}.json"
+    prof.export_chrome_trace(str(trace_path))
+    table = prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=40)
+    return thread, trace_path, table
+
+
+def _write_artifacts(out_dir, sampler, torch_results, meta):
+    torch_results = [r for r in torch_results if r is not None]
+    if torch_results:
+        merged = None
+        for _, trace_path, _ in torch_results:
+            with open(trace_path) as f:
+                trace = json.load(f)
+            if merged is None:
+                merged = trace
+            else:
+                merged["traceEvents"].extend(trace.get("traceEvents", []))
+            trace_path.unlink()
+        with open(out_dir / "torch_trace.json", "w") as f:
+            json.dump(merged, f)
+        (out_dir / "torch_ops.txt").write_text("\n".join(
+            f"# {thread}\n{table}\n" for thread, _, table in torch_results
+        ))
+    (out_dir / "python_stacks.folded").write_text(sampler.folded())
+    meta["artifacts"] = sorted(p.name for p in out_dir.iterdir())
+    (out_dir / "capture.json").write_text(json.dumps(meta, indent=2))
+
+
+class Profiler:
+    """
+    One capture at a time. All methods run on the event loop thread; the
+    sampler and the per-worker torch profilers do the work elsewhere.
+    """
+
+    def __init__(self, executor, out_root, max_seconds, use_torch):
+        self.executor = executor
+        self.out_root = Path(out_root)
+        self.max_seconds = float(max_seconds)
+        self.use_torch = use_torch
+        self.active = None
+        self.last = None
+        self._sampler = None
+        self._timer = None
+        self._stopping = None
+
+    async def start(self, requests=None, seconds=None, sample_interval_ms=5.0):
+        global _torch_active
+        if self.active is not None:
+            raise ProfileBusy("a profile capture is already running")
+
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        # Captures in the same second get -1, -2, ...; never reuse a directory
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.out_root.mkdir(parents=True, exist_ok=True)
+        for n in itertools.count():
+            capture_id = stamp if n == 0 else f"{stamp}-{n}"
+            out_dir = self.out_root / capture_id
+            try:
+                out_dir.mkdir()
+                break
+            except FileExistsError:
+                continue
+        self.active = {
+            "id": capture_id,
+            "dir": str(out_dir),
+            "requests": requests,
+            "seconds": seconds,
+            "sample_interval_ms": sample_interval_ms,
+            "torch": self.use_torch,
+            "started_at": time.time(),
+            "requests_seen": 0,
+        }
+
+        try:
+            if self.use_torch:
+                await self.executor.run_on_each_worker(_start_torch_profiler)
+                _torch_active = True
+        except Exception:
+            await self.executor.run_on_each_worker(partial(_stop_torch_profiler, out_dir))
+            self.active = None
+            raise
+
+        self._sampler = StackSampler(sample_interval_ms / 1000.0)
+        self._sampler.start()
+        self._timer = asyncio.get_running_loop().call_later(
+            seconds, self._schedule_stop, "seconds"
+        )
+        logger.info("profile capture %s started: %s", capture_id, self.active)
+        return dict(self.active)
+
+    def request_done(self):
+        """Count one finished predict request towards the capture's limit."""
+        if self.active is None:
+            return
+        self.active["requests_seen"] += 1
+        limit = self.active["requests"]
+        if limit is not None and self.active["requests_seen"] >= limit:
+            self._schedule_stop("requests")
+
+    def _schedule_stop(self, reason):
+        if self.active is not None and self._stopping is None:
+            self._stopping = asyncio.ensure_future(self._stop(reason))
+        return self._stopping
+
+    async def stop(self, reason="manual"):
+        """Stop the running capture now; its metadata, or None if idle."""
+        stopping = self._schedule_stop(reason)
+        if stopping is None:
+            return None
+        return await asyncio.shield(stopping)
+
+    async def _stop(self, reason):
+        global _torch_active
+        meta = self.active
+        out_dir = Path(meta["dir"])
+        self._timer.cancel()
+        _torch_active = False
+        try:
+            await asyncio.to_thread(self._sampler.stop)
+            torch_results = []
+            if meta["torch"]:
+                torch_results = await self.executor.run_on_each_worker(
+                    partial(_stop_torch_profiler, out_dir)
+                )
+            meta.update(
+                stop_reason=reason,
+                duration_s=time.time() - meta["started_at"],
+                stack_samples=self._sampler.samples,
+            )
+            await asyncio.to_thread(_write_artifacts, out_dir, self._sampler, torch_results, meta)
+            logger.info("profile capture %s written to %s", meta["id"], out_dir)
+        finally:
+            self.last = meta
+            self.active = None
+            self._sampler = None
+            self._stopping = None
+        return meta
+
+    def snapshot(self):
+        return {
+            "active": dict(self.active) if self.active is not None else None,
+            "last": self.last,
+            "max_seconds": self.max_seconds,
+            "torch": self.use_torch,
+        }
@@ -0,0 +1,184 @@
+"""
+int8 SmallCNN variant with an accuracy gate.
+
+    python -m api.quantize --version mnist_cnn
+
+- convs: static post-training quantization (Conv+ReLU fused), calibrated
+  on the local MNIST images
+- Linear layers: dynamic int8 quantization
+- gate: accuracy on the 10k test split must stay within
+  --max-accuracy-drop of the fp32 checkpoint
+
+Only a variant that passes the gate is published, as
+``<version>_int8.ts`` (TorchScript) into the registry directory, where
+it can be pinned with ?version= or swapped in as the default. A JSON
+report is written next to it either way.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao.quantization import (
+    DeQuantStub,
+    QuantStub,
+    convert,
+    fuse_modules,
+    get_default_qconfig,
+    prepare,
+    quantize_dynamic,
+)
+
+from api.config import MODEL_PATH
+from api.engines.torch_engine import TorchEngine, load_model
+from api.mnist_data import has_split, load_split
+
+QUANT_BACKEND = "x86" if "x86" in torch.backends.quantized.supported_engines else "qnnpack"
+
+
+class QuantizableSmallCNN(nn.Module):
+    """SmallCNN split into a statically quantized conv stack and a float head."""
+
+    def __init__(self, float_model):
+        super().__init__()
+        net = float_model.net
+        self.quant = QuantStub()
+        # conv1, relu, pool, conv2, relu, pool
+        self.features = nn.Sequential(*net[:6])
+        self.dequant = DeQuantStub()
+        # flatten, fc1, relu, fc2 (quantized dynamically)
+        self.classifier = nn.Sequential(*net[6:])
+
+    def forward(self, x):
+        x = self.dequant(self.features(self.quant(x)))
+        return self.classifier(x)
+
+
+def _to_input(images_uint8):
+    return torch.from_numpy(images_uint8.astype(np.float32)).unsqueeze(1) / 255.0
+
+
+def quantize(float_model, calibration_images, batch_size=256):
+    torch.backends.quantized.engine = QUANT_BACKEND
+
+    model = QuantizableSmallCNN(float_model).eval()
+    fuse_modules(model.features, [["0", "1"], ["3", "4"]], inplace=True)
+
+    model.qconfig = get_default_qconfig(QUANT_BACKEND)
+    model.classifier.qconfig = None  # left to quantize_dynamic
+    prepare(model, inplace=True)
+    with torch.no_grad():
+        for i in range(0, len(calibration_images), batch_size):
+            model(_to_input(calibration_images[i:i + batch_size]))
+    convert(model, inplace=True)
+
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def evaluate(model, images, labels, batch_size=1000):
+    engine = TorchEngine(model)
+    preds = np.concatenate([
+        engine.predict_batch(images[i:i + batch_size])[0]
+        for i in range(0, len(images), batch_size)
+    ])
+    return preds, float((preds == labels).mean())
+
+
+def _serialized_bytes(save, obj):
+    buf = io.BytesIO()
+    save(obj, buf)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and gate an int8 SmallCNN")
+    parser.add_argument("--version", default="mnist_cnn")
+    parser.add_argument("--model-dir", default=os.path.join(MODEL_PATH, "mnist"))
+    parser.add_argument("--calibration-size", type=int, default=2000)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005,
+                        help="allowed absolute test accuracy drop vs fp32")
+    args = parser.parse_args()
+
+    model_dir = Path(args.model_dir)
+    checkpoint = model_dir / f"{args.version}.pth"
+    out_path = model_dir / f"{args.version}_int8.ts"
+    report_path = model_dir / f"{args.version}_int8.quant.json"
+
+    test_images, test_labels = load_split("test")
+    if has_split("train"):
+        calibration_source = "train"
+        calibration_images = load_split("train")[0][:args.calibration_size]
+        eval_split = "test"
+    else:
+        # Calibrate on the head of test and gate on the rest, never on the
+        # images the observers have seen
+        if args.calibration_size >= len(test_images):
+            parser.error(
+                f"--calibration-size {args.calibration_size} leaves no held-out "
+                f"test images ({len(test_images)} without a train split)"
+            )
+        calibration_source = "test"
+        calibration_images = test_images[:args.calibration_size]
+        test_images = test_images[args.calibration_size:]
+        test_labels = test_labels[args.calibration_size:]
+        eval_split = f"test[{args.calibration_size}:]"
+
+    float_model = load_model(str(checkpoint))
+    started = time.perf_counter()
+    int8_model = quantize(load_model(str(checkpoint)), calibration_images)
+    quantize_s = time.perf_counter() - started
+
+    fp32_preds, fp32_acc = evaluate(float_model, test_images, test_labels)
+    int8_preds, int8_acc = evaluate(int8_model, test_images, test_labels)
+    passed = int8_acc >= fp32_acc - args.max_accuracy_drop
+
+    with torch.no_grad():
+        scripted = torch.jit.trace(int8_model, _to_input(test_images[:8]))
+    int8_blob = _serialized_bytes(torch.jit.save, scripted)
+    fp32_blob = _serialized_bytes(torch.save, float_model.state_dict())
+
+    report = {
+        "version": args.version,
+        "variant": out_path.stem,
+        "backend": QUANT_BACKEND,
+        "calibration_source": calibration_source,
+        "calibration_size": int(len(calibration_images)),
+        "eval_split": eval_split,
+        "test_size": int(len(test_labels)),
+        "fp32_accuracy": fp32_acc,
+        "int8_accuracy": int8_acc,
+        "accuracy_drop": fp32_acc - int8_acc,
+        "max_accuracy_drop": args.max_accuracy_drop,
+        "prediction_agreement": float((fp32_preds == int8_preds).mean()),
+        "fp32_weights_bytes": len(fp32_blob),
+        "int8_model_bytes": len(int8_blob),
+        "quantize_s": quantize_s,
+        "published": passed,
+    }
+
+    if passed:
+        tmp_path = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(int8_blob)
+        os.replace(tmp_path, out_path)
+        report["path"] = str(out_path)
+
+    report_path.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+    if not passed:
+        print(
+            f"❌ int8 accuracy {int8_acc:.4f} is more than "
+            f"{args.max_accuracy_drop} below fp32 {fp32_acc:.4f}; not published",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
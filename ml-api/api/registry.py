@@ -0,0 +1,166 @@
+import threading
+import time
+from pathlib import Path
+
+
+class UnknownModelVersion(KeyError):
+    """Requested version has no checkpoint under the registry root."""
+
+
+class ModelHandle:
+    __slots__ = ("version", "path", "model", "loaded_at", "load_s")
+
+    def __init__(self, version, path, model, load_s):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.loaded_at = time.time()
+        self.load_s = load_s
+
+
+class ModelRegistry:
+    """
+    Versioned checkpoints under one directory, loaded on first use.
+
+    Every ``<version><suffix>`` file in ``root`` is a version. ``loader``
+    turns ``(version, path)`` into a ready-to-serve model and is only
+    called the first time a version is requested. Only files with the
+    first suffix (the original checkpoints) can become the implicit
+    default; derived variants have to be pinned or swapped in explicitly.
+
+    The default version is a single reference swapped under a lock, so
+    ``set_default`` is atomic: requests that already resolved a handle
+    keep using it, new requests get the new one, nothing is dropped.
+    """
+
+    def __init__(self, root, loader, suffixes=(".pth",), default_version=None):
+        self.root = Path(root)
+        self.suffixes = tuple(suffixes)
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._paths = {}
+        self._handles = {}
+        self._default = default_version
+        self._swap_listeners = []
+        self.swaps = 0
+        self.scanned_at = 0.0
+        self.scan()
+
+    # --------------------------------------------------
+    # Discovery
+    # --------------------------------------------------
+    def scan(self):
+        """Re-read the registry directory; returns the known versions."""
+        found = {}
+        if self.root.is_dir():
+            for suffix in self.suffixes:
+                for p in sorted(self.root.glob(f"*{suffix}")):
+                    found.setdefault(p.name[:-len(suffix)], p)
+
+        with self._lock:
+            self._paths = found
+            self.scanned_at = time.monotonic()
+            if self._default not in found:
+                # Lexicographically last checkpoint wins when none is pinned
+                primary = [
+                    v for v, p in found.items() if p.name.endswith(self.suffixes[0])
+                ]
+                self._default = max(primary or found) if found else None
+        return sorted(found)
+
+    def versions(self):
+        with self._lock:
+            return sorted(self._paths)
+
+    @property
+    def default_version(self):
+        return self._default
+
+    def has_version(self, version):
+        with self._lock:
+            return version in self._paths
+
+    def path_for(self, version):
+        with self._lock:
+            path = self._paths.get(version)
+        if path is None:
+            raise UnknownModelVersion(version)
+        return path
+
+    # --------------------------------------------------
+    # Loading
+    # --------------------------------------------------
+    def is_loaded(self, version=None):
+        return (version or self._default) in self._handles
+
+    def get(self, version=None):
+        """Return the handle for ``version`` (default if None), loading it once."""
+        version = version or self._default
+        if version is None:
+            raise UnknownModelVersion("no model versions found")
+
+        handle = self._handles.get(version)
+        if handle is not None:
+            return handle
+
+        path = self.path_for(version)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(version, threading.Lock())
+
+        with load_lock:
+            handle = self._handles.get(version)
+            if handle is None:
+                started = time.perf_counter()
+                model = self._loader(version, path)
+                handle = ModelHandle(version, path, model, time.perf_counter() - started)
+                self._handles[version] = handle
+        return handle
+
+    def add_swap_listener(self, fn):
+        """Call ``fn(old_version, new_version)`` after every default swap."""
+        self._swap_listeners.append(fn)
+
+    def load(self, version):
+        """Like ``get``, but rescans the root for checkpoints added since."""
+        try:
+            self.path_for(version)
+        except UnknownModelVersion:
+            self.scan()
+        return self.get(version)
+
+    def set_default(self, version):
+        """Load ``version`` (rescanning if needed), then make it the default."""
+        handle = self.load(version)
+        with self._lock:
+            previous = self._default
+            self._default = handle.version
+            self.swaps += 1
+        for fn in self._swap_listeners:
+            fn(previous, handle.version)
+        return handle
+
+    def snapshot(self):
+        with self._lock:
+            paths = dict(self._paths)
+        return {
+            "root": str(self.root),
+            "default_version": self._default,
+            "swaps": self.swaps,
+            "versions": [
+                {
+                    "version": version,
+                    "path": str(path),
+                    "loaded": version in self._handles,
+                    "engine": (
+                        getattr(self._handles[version].model, "name", None)
+                        if version in self._handles else None
+                    ),
+                    "load_s": (
+                        self._handles[version].load_s
+                        if version in self._handles else None
+                    ),
+                }
+                for version, path in sorted(paths.items())
+            ],
+        }
@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Response shapes for the predict routes
+FULL = "full"  # {"predicted_label": 3, "probabilities": {"0": ..., "9": ...}}
+COMPACT = "compact"  # {"predicted_label": 3, "probabilities": [p0, ..., p9]}
+
+LABEL_KEYS = tuple(str(i) for i in range(10))
+
+
+def _numpy_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(
+            content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(
+        content, default=_numpy_default, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson-backed response that serializes numpy arrays natively.
+
+    Routes return it directly, which also skips FastAPI's response_model
+    re-validation of the body.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _top_k(probs, k):
+    """Top-k labels and probabilities along the last axis, highest first."""
+    # orjson only serializes C-contiguous arrays
+    idx = np.ascontiguousarray(np.argsort(-probs, axis=-1)[..., :k])
+    return idx, np.take_along_axis(probs, idx, axis=-1)
+
+
+def prediction_body(pred, probs, shape=FULL, top_k=None):
+    if top_k:
+        labels, top = _top_k(probs, top_k)
+        return {"predicted_label": pred, "top_k": {"labels": labels, "probabilities": top}}
+    if shape == COMPACT:
+        return {"predicted_label": pred, "probabilities": probs}
+    return {"predicted_label": pred, "probabilities": dict(zip(LABEL_KEYS, probs.tolist()))}
+
+
+def batch_prediction_body(preds, probs, top_k=None):
+    if top_k:
+        labels, top = _top_k(probs, top_k)
+        return {"predicted_labels": preds, "top_k": {"labels": labels, "probabilities": top}}
+    return {"predicted_labels": preds, "probabilities": probs}
@@ -0,0 +1,205 @@
+"""
+Multi-process serving for ml-api.
+
+    python -m api.serve --workers 4 --pin-cpus
+
+The supervisor exports the SmallCNN weights of every registry version
+once to mmap-able files on /dev/shm, binds the listening socket, and
+spawns uvicorn worker processes that share both. Workers attach to the
+weights zero-copy (see ``api.engines.torch_engine.load_shared_model``) and can be pinned
+to disjoint CPU sets so their torch threads do not compete.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import time
+
+from api.config import (
+    LOG_LEVEL,
+    MODEL_PATH,
+    SERVE_HOST,
+    SERVE_PIN_CPUS,
+    SERVE_PORT,
+    SERVE_WORKERS,
+    SHARED_WEIGHTS_DIR,
+)
+from api.registry import ModelRegistry
+
+# How long a fresh worker gets to load and mmap its default version
+SHARED_CHECK_TIMEOUT_S = 60.0
+
+
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cpu_sets(workers, cpus):
+    """Split ``cpus`` into ``workers`` contiguous, non-overlapping chunks."""
+    if workers > len(cpus):
+        # More workers than cores: round-robin single cores
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    chunk, extra = divmod(len(cpus), workers)
+    sets, start = [], 0
+    for i in range(workers):
+        size = chunk + (1 if i < extra else 0)
+        sets.append(cpus[start:start + size])
+        start += size
+    return sets
+
+
+def export_weights_dir(checkpoint_path, out_path):
+    """
+    Re-save the checkpoint's state_dict in a form workers can mmap.
+
+    Put ``out_path`` on tmpfs (/dev/shm) to keep the pages in shared memory.
+    """
+    import torch
+
+    ckpt = torch.load(checkpoint_path, map_location="cpu")
+    state_dict = {k: v.contiguous() for k, v in ckpt["state_dict"].items()}
+    tmp_path = f"{out_path}.tmp"
+    torch.save({"state_dict": state_dict}, tmp_path)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def maps_shared_weights(pid, weights_dir):
+    """Whether process ``pid`` has a file under ``weights_dir`` mmapped."""
+    prefix = os.path.join(os.path.realpath(weights_dir), "")
+    try:
+        with open(f"/proc/{pid}/maps") as f:
+            return any(
+                len(fields) == 6 and fields[5].startswith(prefix)
+                for fields in (line.split(maxsplit=5) for line in f)
+            )
+    except OSError:
+        return False
+
+
+def _run_worker(sock, cpus, log_level):
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+    import uvicorn
+
+    config = uvicorn.Config("api.main:app", log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, sock, weights_dir, cpu_sets, log_level):
+        self.sock = sock
+        self.weights_dir = weights_dir
+        self.cpu_sets = cpu_sets
+        self.log_level = log_level
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs = [None] * len(cpu_sets)
+        # worker index -> deadline for its shared-weights mapping check
+        self._unverified = {}
+        self._stopping = False
+
+    def _spawn(self, i):
+        proc = self._ctx.Process(
+            target=_run_worker,
+            args=(self.sock, self.cpu_sets[i], self.log_level),
+            name=f"ml-api-worker-{i}",
+        )
+        proc.start()
+        self._procs[i] = proc
+        self._unverified[i] = time.monotonic() + SHARED_CHECK_TIMEOUT_S
+        cpus = ",".join(map(str, self.cpu_sets[i])) if self.cpu_sets[i] else "any"
+        print(f"[serve] worker {i} pid={proc.pid} cpus={cpus}")
+
+    def _check_shared_weights(self):
+        for i, deadline in list(self._unverified.items()):
+            pid = self._procs[i].pid
+            if maps_shared_weights(pid, self.weights_dir):
+                print(f"[serve] worker {i} pid={pid} maps shared weights")
+            elif time.monotonic() > deadline:
+                print(f"[serve] WARNING: worker {i} pid={pid} does not map "
+                      f"{self.weights_dir} after {SHARED_CHECK_TIMEOUT_S:.0f}s, "
+                      f"it holds a private copy of the weights")
+            else:
+                continue
+            del self._unverified[i]
+
+    def stop(self, *_):
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        # Spawned workers import api.config, which reads this once at import,
+        # so it has to be in the environment they inherit from us
+        os.environ["MODEL_SHARED_WEIGHTS_DIR"] = self.weights_dir
+        for i in range(len(self._procs)):
+            self._spawn(i)
+
+        while not self._stopping:
+            for i, proc in enumerate(self._procs):
+                if not proc.is_alive() and not self._stopping:
+                    print(f"[serve] worker {i} exited with {proc.exitcode}, restarting")
+                    self._spawn(i)
+            self._check_shared_weights()
+            time.sleep(0.5)
+
+        for proc in self._procs:
+            proc.terminate()
+        for proc in self._procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process ml-api server")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS,
+                        help="0 = one per available CPU")
+    parser.add_argument("--pin-cpus", action=argparse.BooleanOptionalAction,
+                        default=SERVE_PIN_CPUS)
+    parser.add_argument("--model-dir", default=os.path.join(MODEL_PATH, "mnist"))
+    parser.add_argument("--shared-dir", default=SHARED_WEIGHTS_DIR)
+    args = parser.parse_args()
+
+    cpus = _available_cpus()
+    workers = args.workers or len(cpus)
+    cpu_sets = plan_cpu_sets(workers, cpus) if args.pin_cpus else [[]] * workers
+
+    weights_dir = os.path.join(args.shared_dir, f"ml-api-{os.getpid()}")
+    os.makedirs(weights_dir, exist_ok=True)
+    registry = ModelRegistry(args.model_dir, loader=None)
+    for version in registry.versions():
+        export_weights_dir(
+            registry.path_for(version),
+            os.path.join(weights_dir, f"{version}.pt"),
+        )
+        print(f"[serve] shared weights: {version} -> {weights_dir}")
+
+    sock = _bind_socket(args.host, args.port)
+    print(f"[serve] listening on {args.host}:{args.port} with {workers} workers")
+
+    try:
+        Supervisor(sock, weights_dir, cpu_sets, LOG_LEVEL).run()
+    finally:
+        sock.close()
+        shutil.rmtree(weights_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Startup warmup behind the /ready probe.
+
+The first forward passes of a fresh process pay for allocator growth,
+oneDNN primitive creation and (for onnx/torch_optimized) graph
+specialization per input shape. Warmup loads the default version and runs
+synthetic batches of every configured size on every inference worker
+before /ready reports ready, so a rolling deploy only sends traffic to
+warm replicas. /health stays a pure liveness check.
+"""
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from api.metrics import stage_timings_paused
+
+logger = logging.getLogger(__name__)
+
+
+def default_batch_sizes(max_batch_size):
+    """Powers of two up to ``max_batch_size``, plus ``max_batch_size`` itself."""
+    sizes = {1, max(1, int(max_batch_size))}
+    size = 2
+    while size < max_batch_size:
+        sizes.add(size)
+        size *= 2
+    return sorted(sizes)
+
+
+def _synthetic_images(n, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size=(n, 28, 28), dtype=np.uint8)
+
+
+def run_batches(predict_batch, model, batch_sizes, rounds):
+    """
+    Per batch size: ms of the first (cold) and the last call. The calls
+    stay out of STAGE_SECONDS so cold starts do not skew its quantiles.
+    """
+    images = _synthetic_images(max(batch_sizes))
+    timings = {}
+    with stage_timings_paused():
+        for size in batch_sizes:
+            calls_ms = []
+            for _ in range(max(1, rounds)):
+                started = time.perf_counter()
+                predict_batch(images[:size], model)
+                calls_ms.append((time.perf_counter() - started) * 1000.0)
+            timings[size] = {"first_ms": calls_ms[0], "last_ms": calls_ms[-1]}
+    return timings
+
+
+class Readiness:
+    """Startup phase and timings reported by /ready."""
+
+    def __init__(self, import_s):
+        self.phase = "starting"  # starting -> loading -> warming -> ready | failed
+        self.error = None
+        self.timings = {"import_s": import_s}
+        self._started = time.perf_counter()
+
+    @property
+    def ready(self):
+        return self.phase == "ready"
+
+    async def warm_up(self, executor, registry, predict_batch, batch_sizes, rounds):
+        """Load the default version, then warm every worker at every size."""
+        try:
+            self.phase = "loading"
+            handle = await executor.run(registry.get)
+            self.timings["model_version"] = handle.version
+            self.timings["checkpoint_load_s"] = handle.load_s
+
+            self.phase = "warming"
+            started = time.perf_counter()
+            if batch_sizes:
+                per_worker = await executor.run_on_each_worker(
+                    lambda: run_batches(predict_batch, handle.model, batch_sizes, rounds)
+                )
+                self.timings["warmup_batches_ms"] = {
+                    size: {
+                        "first_ms": max(w[size]["first_ms"] for w in per_worker),
+                        "last_ms": max(w[size]["last_ms"] for w in per_worker),
+                    }
+                    for size in batch_sizes
+                }
+            self.timings["warmup_s"] = time.perf_counter() - started
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self.phase = "failed"
+            self.error = f"{type(exc).__name__}: {exc}"
+            logger.exception("warmup failed; /ready stays unready")
+            return
+
+        self.timings["startup_s"] = self.timings["import_s"] + (
+            time.perf_counter() - self._started
+        )
+        self.phase = "ready"
+        logger.info("ready: %s", self.timings)
+
+    def snapshot(self):
+        body = {"ready": self.ready, "phase": self.phase, "timings": self.timings}
+        if self.error is not None:
+            body["error"] = self.error
+        return body
@@ -1,7 +1,9 @@
 # pages/admin_dashboard.py
 import streamlit as st
 import pandas as pd
-from utils.db import get_conn, put_conn
+from utils.db import get_conn, put_conn, pool_stats
+from utils.inference_client import client
+from utils.log_writer import writer
 
 st.set_page_config(page_title="Admin Dashboard", layout="wide")
 
@@ -67,5 +69,134 @@ try:
         st.subheader("❌ Частые ошибки модели")
         st.dataframe(df, width='stretch')
 
+        st.divider()
+
+        # Accuracy на всём датасете по предрасчёту (db/score_mnist.py)
+        cur.execute("""
+            SELECT
+                p.model_version,
+                s.split,
+                COUNT(*) AS scored,
+                AVG((p.predicted_label = s.label)::int) AS accuracy,
+                AVG(p.confidence) AS mean_confidence,
+                MAX(p.created_at) AS scored_at
+            FROM ml.mnist_predictions p
+            JOIN demo.mnist_samples s ON s.id = p.sample_id
+            GROUP BY p.model_version, s.split
+            ORDER BY p.model_version, s.split
+        """)
+        rows = cur.fetchall()
+
+        st.subheader("🎯 Accuracy по версиям модели (весь датасет)")
+        if rows:
+            df = pd.DataFrame(
+                rows,
+                columns=["model_version", "split", "scored", "accuracy", "mean_confidence", "scored_at"],
+            )
+            df["accuracy"] = df["accuracy"].astype(float)
+            df["mean_confidence"] = df["mean_confidence"].astype(float)
+            st.dataframe(
+                df.style.format({"accuracy": "{:.2%}", "mean_confidence": "{:.3f}"}),
+                width='stretch',
+            )
+
+            versions = sorted(df["model_version"].unique())
+            version = st.selectbox("Ошибки версии", versions)
+            cur.execute("""
+                SELECT s.label AS true_label, p.predicted_label, COUNT(*) AS cnt
+                FROM ml.mnist_predictions p
+                JOIN demo.mnist_samples s ON s.id = p.sample_id
+                WHERE p.model_version = %s AND p.predicted_label <> s.label
+                GROUP BY s.label, p.predicted_label
+                ORDER BY cnt DESC
+                LIMIT 20
+            """, (version,))
+            st.dataframe(
+                pd.DataFrame(cur.fetchall(), columns=["true_label", "predicted_label", "count"]),
+                width='stretch',
+            )
+        else:
+            st.info(
+                "Предрасчёта ещё нет: PYTHONPATH=web-app python db/score_mnist.py "
+                "[--version ...]; до этого grid использует live-инференс"
+            )
+
 finally:
     put_conn(conn)
+
+# --------------------------------------------------
+# Inference log writer (очередь фоновой записи логов)
+# --------------------------------------------------
+st.divider()
+st.subheader("📝 Запись логов инференса")
+
+log_stats = writer.snapshot()
+c1, c2, c3, c4 = st.columns(4)
+c1.metric(
+    "Очередь",
+    f"{log_stats['queue_depth']} / {log_stats['max_queue']}",
+    f"max {log_stats['max_depth']}",
+    delta_color="off",
+)
+c2.metric("Записано", log_stats["written"], f"{log_stats['flushes']} пачек", delta_color="off")
+c3.metric("Ожидали места (backpressure)", log_stats["blocked"])
+c4.metric(
+    "Потеряно",
+    log_stats["dropped"] + log_stats["failed"],
+    f"переполнение {log_stats['dropped']} / ошибки БД {log_stats['failed']}",
+    delta_color="off",
+)
+st.caption(
+    f"Средний размер пачки: {log_stats['mean_batch']:.1f}, "
+    f"последний flush: {log_stats['last_flush_ms']:.1f} ms"
+)
+if log_stats["last_error"]:
+    st.warning(f"Последняя ошибка записи: {log_stats['last_error']}")
+
+# --------------------------------------------------
+# DB connection pool (занятость и ожидание соединений)
+# --------------------------------------------------
+st.divider()
+st.subheader("🗄️ Пул соединений БД")
+
+pool = pool_stats()
+c1, c2, c3, c4 = st.columns(4)
+c1.metric(
+    "Занято",
+    f"{pool['in_use']} / {pool['max']}",
+    f"пик {pool['peak_in_use']}, открыто {pool['size']}",
+    delta_color="off",
+)
+c2.metric("Насыщение", f"{pool['saturation']:.0%}", f"ждут {pool['waiting']}", delta_color="off")
+c3.metric(
+    "Ожидание соединения",
+    f"{pool['wait_ms_p50']:.1f} ms",
+    f"p99 {pool['wait_ms_p99']:.1f} / max {pool['wait_ms_max']:.1f} ms",
+    delta_color="off",
+)
+c4.metric("Таймауты", pool["timeouts"])
+st.caption(
+    f"Выдач: {pool['checkouts']} (с ожиданием {pool['waited']}), "
+    f"создано соединений: {pool['created']}, "
+    f"пересоздано по возрасту: {pool['recycled']}, "
+    f"отброшено неисправных: {pool['discarded']}"
+)
+
+# --------------------------------------------------
+# Inference API client (keep-alive пул, кэш /ready)
+# --------------------------------------------------
+st.divider()
+st.subheader("🔌 Клиент Inference API")
+
+api = client.snapshot()
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Backend", {True: "✅ готов", False: "❌ недоступен"}.get(api["healthy"], "—"))
+c2.metric("Вызовов", api["calls"], f"{api['mean_ms']:.1f} ms в среднем", delta_color="off")
+c3.metric("Повторов", api["retried"], f"ошибок {api['failed']}", delta_color="off")
+c4.metric(
+    "Проверок /ready",
+    api["health_checks"],
+    f"из кэша {api['health_cache_hits']}",
+    delta_color="off",
+)
+st.caption(f"Backend: {api['base_url']}")
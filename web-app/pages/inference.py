@@ -1,31 +1,15 @@
 # pages/inference.py
-import os
-import requests
-import numpy as np
+import logging
+
 import streamlit as st
 from PIL import Image, ImageOps
 
-from utils.db import get_conn, put_conn
 from utils.inference import log_inference
+from utils.inference_client import InferenceError, client
+from utils.mnist_samples import decode_vec, precomputed_predictions, sample_per_label
+from utils.sample_store import SAMPLE_STORE_CHECK_S, SampleStore
 
-# ==================================================
-# Config
-# ==================================================
-API_BASE = os.getenv(
-    "INFERENCE_API_URL",
-    "http://localhost:8000"
-)
-
-PREDICT_URL = f"{API_BASE}/mnist/predict"
-
-
-def check_backend_health():
-    try:
-        r = requests.get(f"{API_BASE}/health", timeout=2)
-        return r.status_code == 200
-    except requests.exceptions.RequestException:
-        return False
-
+logger = logging.getLogger(__name__)
 
 st.set_page_config(page_title="MNIST Inference", layout="centered")
 st.title("🧠 MNIST Inference Platform")
@@ -37,8 +21,8 @@ if not st.session_state.get("authenticated"):
     st.warning("Пожалуйста, войдите в систему")
     st.stop()
 
-if not check_backend_health():
-    st.error("❌ Inference backend недоступен (FastAPI не запущен)")
+if not client.is_healthy():
+    st.error("❌ Inference backend недоступен или ещё не готов (/ready)")
     st.stop()
 else:
     st.success("✅ Inference backend доступен")
@@ -54,55 +38,96 @@ if "mnist_stats" not in st.session_state:
 
 
 # ==================================================
-# FastAPI client
+# FastAPI client (utils/inference_client.py)
 # ==================================================
 def predict_via_api(pil_img_28):
-    pixels = np.array(pil_img_28, dtype=np.float32).reshape(-1).tolist()
+    try:
+        return client.predict(pil_img_28)
+    except InferenceError as exc:
+        st.error(f"❌ Inference backend недоступен: {exc}")
+        st.stop()
 
-    r = requests.post(
-        PREDICT_URL,
-        json={"pixels": pixels},
-        timeout=5,
-    )
 
-    if r.status_code != 200:
-        st.error("❌ Inference backend недоступен")
+def predict_batch_via_api(pil_imgs_28):
+    try:
+        return client.predict_batch(pil_imgs_28)
+    except InferenceError as exc:
+        st.error(f"❌ Inference backend недоступен: {exc}")
         st.stop()
 
-    data = r.json()
-    pred = int(data["predicted_label"])
-    probs = {int(k): float(v) for k, v in data["probabilities"].items()}
-    return pred, probs
-
 
 # ==================================================
-# MNIST DB helpers
+# MNIST samples (локальное хранилище, БД — запасной путь)
 # ==================================================
+@st.cache_resource(ttl=SAMPLE_STORE_CHECK_S, show_spinner="Выгрузка MNIST в локальное хранилище…")
+def _sample_store(split):
+    # один memmap на процесс, общий для всех сессий; исключения не кэшируются;
+    # по ttl открывается заново и сверяется с БД
+    return SampleStore.open(split)
+
+
+def get_sample_store(split="test"):
+    try:
+        return _sample_store(split)
+    except Exception:
+        logger.exception("MNIST sample store unavailable, sampling from the database")
+        return None
+
+
 def fetch_one_per_digit():
-    conn = get_conn()
+    """[(true_label, uint8 28x28, картинка для st.image, sample_id) | None] * 10"""
+    store = get_sample_store("test")
+    if store is not None:
+        picks = store.sample(k=1)
+        grid = []
+        for d in range(10):
+            if d not in picks:
+                grid.append(None)
+                continue
+            i = picks[d][0]
+            grid.append((d, store.image(i), store.thumbnail(i), int(store.ids[i])))
+        return grid
+
+    samples = sample_per_label(k=1, split="test")
+    grid = []
+    for d in range(10):
+        if d not in samples:
+            grid.append(None)
+            continue
+        _, vec, rows, cols, dtype, sample_id = samples[d][0]
+        img = decode_vec(vec, rows, cols, dtype)
+        grid.append((d, img, img, sample_id))
+    return grid
+
+
+def predict_grid(grid):
+    """
+    {позиция в grid: (pred, probs, model_version, precomputed)}.
+
+    Ответ для текущей версии по умолчанию берётся из ml.mnist_predictions
+    (db/score_mnist.py); отсутствующие — одним batch-запросом к API.
+    """
+    grid_idx = [i for i, row in enumerate(grid) if row]
     try:
-        samples = []
-        with conn.cursor() as cur:
-            for d in range(10):
-                cur.execute(
-                    """
-                    SELECT label, vec, rows, cols
-                    FROM demo.mnist_samples
-                    WHERE split = 'test' AND label = %s
-                    ORDER BY random()
-                    LIMIT 1
-                    """,
-                    (d,),
-                )
-                samples.append(cur.fetchone())
-        return samples
-    finally:
-        put_conn(conn)
-
-
-def vec_to_pil(vec_blob, rows, cols):
-    arr = np.frombuffer(vec_blob, dtype=np.float32).reshape(rows, cols)
-    return Image.fromarray((arr * 255).astype(np.uint8))
+        version = client.default_version()
+    except InferenceError:
+        version = None
+    precomputed = precomputed_predictions([grid[i][3] for i in grid_idx], version)
+
+    preds = {}
+    live_idx = []
+    for i in grid_idx:
+        hit = precomputed.get(grid[i][3])
+        if hit is not None:
+            preds[i] = (*hit, True)
+        else:
+            live_idx.append(i)
+
+    # one batched request for the rest of the grid instead of a POST per click
+    if live_idx:
+        live = predict_batch_via_api([grid[i][1] for i in live_idx])
+        preds.update((i, (*p, False)) for i, p in zip(live_idx, live))
+    return preds
 
 
 def preprocess_upload(pil_img, invert=False):
@@ -120,7 +145,12 @@ st.subheader("⚡ Быстрый тест MNIST (grid 0–9)")
 st.caption("Известен истинный класс → считается accuracy")
 
 if "mnist_grid" not in st.session_state or st.button("🔄 Обновить примеры"):
-    st.session_state.mnist_grid = fetch_one_per_digit()
+    # grid и ответы меняются только вместе: predict_grid может сделать
+    # st.stop(), и тогда в сессии остаётся прежняя согласованная пара
+    grid = fetch_one_per_digit()
+    grid_preds = predict_grid(grid)
+    st.session_state.mnist_grid = grid
+    st.session_state.mnist_grid_preds = grid_preds
 
 cols = st.columns(10, gap="small")
 clicked = None
@@ -131,19 +161,17 @@ for i, col in enumerate(cols):
         col.write("—")
         continue
 
-    true_label, vec, r, c = row
-    img = vec_to_pil(vec, r, c)
-
-    col.image(img, caption=str(true_label), width='stretch')
+    true_label, _, thumb, sample_id = row
+    col.image(thumb, caption=str(true_label), width='stretch')
     if col.button(f"{true_label}", key=f"pick_mnist_{i}"):
-        pred, probs = predict_via_api(img)
-        clicked = (true_label, pred, probs)
+        pred, probs, model_version, precomputed = st.session_state.mnist_grid_preds[i]
+        clicked = (true_label, sample_id, pred, probs, model_version, precomputed)
 
 # ==================================================
 # Grid result + logging + accuracy
 # ==================================================
 if clicked:
-    true_label, pred, probs = clicked
+    true_label, sample_id, pred, probs, model_version, precomputed = clicked
     is_correct = pred == true_label
 
     # update stats
@@ -159,13 +187,15 @@ if clicked:
         input_payload=None,
         input_meta={
             "source": "mnist_grid",
+            "sample_id": int(sample_id),
+            "precomputed": bool(precomputed),
             "true_label": int(true_label),
             "correct": bool(is_correct),
         },
         predicted_label=str(pred),
         confidence=float(probs[pred]),
         probabilities={str(i): float(probs[i]) for i in range(10)},
-        model_version="mnist_cnn_v1",
+        model_version=model_version,
     )
 
     if is_correct:
@@ -174,6 +204,10 @@ if clicked:
         st.error(f"❌ Предсказание: {pred} | Истинная: {true_label}")
 
     st.bar_chart({str(i): probs[i] for i in range(10)})
+    st.caption(
+        f"Модель {model_version}: "
+        + ("предрасчёт (ml.mnist_predictions)" if precomputed else "live-инференс")
+    )
 
     stats = st.session_state.mnist_stats
     acc = stats["correct"] / stats["total"]
@@ -210,7 +244,7 @@ if file:
     c2.image(pre, caption="28×28 для модели")
 
     if st.button("🔍 Распознать цифру"):
-        pred, probs = predict_via_api(pre)
+        pred, probs, model_version = predict_via_api(pre)
 
         log_inference(
             task="mnist",
@@ -224,7 +258,7 @@ if file:
             predicted_label=str(pred),
             confidence=float(probs[pred]),
             probabilities={str(i): float(probs[i]) for i in range(10)},
-            model_version="mnist_cnn_v1",
+            model_version=model_version,
         )
 
         st.success(f"✅ Предсказание модели: **{pred}**")
@@ -1,7 +1,14 @@
 # utils/db.py
+import atexit
 import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
 from dotenv import load_dotenv
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
 
 # --------------------------------------------------
 # Load environment
@@ -12,14 +19,240 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("❌ DATABASE_URL not set in environment")
 
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Сколько get_conn() ждёт свободное соединение, прежде чем упасть с PoolTimeout
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "10"))
+# Соединения старше этого пересоздаются (0 = без ограничения)
+DB_POOL_MAX_LIFETIME_S = float(os.getenv("DB_POOL_MAX_LIFETIME_S", "1800"))
+# Соединение, простоявшее дольше этого, проверяется SELECT 1 перед выдачей
+DB_POOL_HEALTHCHECK_IDLE_S = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE_S", "30"))
+
+
+class PoolTimeout(RuntimeError):
+    """Нет свободного соединения за DB_POOL_TIMEOUT_S."""
+
+
 # --------------------------------------------------
 # Connection pool
 # --------------------------------------------------
-_pool = SimpleConnectionPool(
-    minconn=1,
-    maxconn=5,
-    dsn=DATABASE_URL,
-)
+class BlockingConnectionPool:
+    """
+    Потокобезопасный пул соединений psycopg2.
+
+    В отличие от SimpleConnectionPool (не потокобезопасен) и
+    ThreadedConnectionPool (при исчерпании бросает PoolError),
+    getconn() ждёт освобождения соединения до timeout_s.
+    Соединения проверяются перед выдачей (закрыто / слишком старое /
+    долго простаивало -> SELECT 1) и пересоздаются при необходимости.
+    """
+
+    def __init__(
+            self,
+            dsn,
+            minconn=DB_POOL_MIN,
+            maxconn=DB_POOL_MAX,
+            timeout_s=DB_POOL_TIMEOUT_S,
+            max_lifetime_s=DB_POOL_MAX_LIFETIME_S,
+            healthcheck_idle_s=DB_POOL_HEALTHCHECK_IDLE_S,
+            window=1024,
+    ):
+        self.dsn = dsn
+        self.maxconn = max(1, int(maxconn))
+        self.minconn = min(max(0, int(minconn)), self.maxconn)
+        self.timeout_s = float(timeout_s)
+        self.max_lifetime_s = float(max_lifetime_s)
+        self.healthcheck_idle_s = float(healthcheck_idle_s)
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, created_at, returned_at), LIFO
+        self._created_at = {}  # id(conn) -> created_at
+        self._checked_out = set()  # id(conn) выданных и ещё не возвращённых
+        self._size = 0  # открытые соединения: свободные + выданные
+        self._closed = False
+
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.discarded = 0
+        self.wait_ms = deque(maxlen=window)
+
+        for _ in range(self.minconn):
+            conn = self._connect()
+            self._size += 1
+            self._idle.append((conn, self._created_at[id(conn)], time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self.created += 1
+        return conn
+
+    def _close(self, conn):
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, created_at, now):
+        return self.max_lifetime_s > 0 and now - created_at > self.max_lifetime_s
+
+    def _usable(self, conn, created_at, returned_at):
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self._expired(created_at, now):
+            return False
+        if now - returned_at > self.healthcheck_idle_s:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn, created_at, returned_at):
+        expired = self._expired(created_at, time.monotonic())
+        with self._cond:
+            if expired:
+                self.recycled += 1
+            else:
+                self.discarded += 1
+        self._close(conn)
+
+    def getconn(self, timeout_s=None):
+        """Выдать соединение; ждёт не дольше timeout_s, иначе PoolTimeout."""
+        timeout_s = self.timeout_s if timeout_s is None else timeout_s
+        started = time.monotonic()
+        deadline = started + timeout_s
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f"no free DB connection in {timeout_s:.1f}s "
+                        f"({self.maxconn} in use, {self.waiting} waiting)"
+                    )
+                waited = True
+                self.waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+        # connect / health check вне блокировки
+        try:
+            if entry is not None and self._usable(*entry):
+                conn = entry[0]
+            else:
+                if entry is not None:
+                    self._discard(*entry)
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._checked_out.add(id(conn))
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.checkouts += 1
+            self.waited += int(waited)
+            self.wait_ms.append((time.monotonic() - started) * 1000.0)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """
+        Вернуть соединение; сломанные и устаревшие закрываются.
+        Повторный возврат (или чужое соединение) — PoolError, как у пулов
+        psycopg2: иначе счётчики уходят в минус, а соединение попадает в
+        idle дважды и достаётся двум потокам.
+        """
+        with self._cond:
+            if id(conn) not in self._checked_out:
+                raise PoolError("connection is not checked out from this pool")
+            self._checked_out.discard(id(conn))
+
+        keep = not close and not self._closed and not conn.closed
+        if keep and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            # незавершённая транзакция не должна достаться следующему
+            try:
+                conn.rollback()
+            except Exception:
+                keep = False
+        with self._cond:
+            created_at = self._created_at.get(id(conn), 0.0)
+        expired = keep and self._expired(created_at, time.monotonic())
+
+        if not keep or expired:
+            self._close(conn)
+        with self._cond:
+            self.recycled += int(expired)
+            keep = keep and not expired
+            self.in_use -= 1
+            if keep:
+                self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def snapshot(self):
+        with self._cond:
+            wait_ms = sorted(self.wait_ms)
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "max": self.maxconn,
+                "saturation": self.in_use / self.maxconn,
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "waited": self.waited,
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "recycled": self.recycled,
+                "discarded": self.discarded,
+                "wait_ms_p50": wait_ms[len(wait_ms) // 2] if wait_ms else 0.0,
+                "wait_ms_p99": wait_ms[int(len(wait_ms) * 0.99)] if wait_ms else 0.0,
+                "wait_ms_max": wait_ms[-1] if wait_ms else 0.0,
+            }
+
+
+_pool = BlockingConnectionPool(DATABASE_URL)
+atexit.register(_pool.closeall)
 
 
 def get_conn():
@@ -29,9 +262,16 @@ def get_conn():
     return _pool.getconn()
 
 
-def put_conn(conn):
+def put_conn(conn, close=False):
     """
     Вернуть соединение обратно в пул.
     """
     if conn:
-        _pool.putconn(conn)
+        _pool.putconn(conn, close=close)
+
+
+def pool_stats():
+    """
+    Метрики пула: занятость, ожидание, пересоздания.
+    """
+    return _pool.snapshot()
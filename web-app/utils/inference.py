@@ -1,24 +1,7 @@
 # utils/inference.py
 import json
-from contextlib import contextmanager
-from utils.db import get_conn, put_conn
-
-
-# --------------------------------------------------
-# DB cursor
-# --------------------------------------------------
-@contextmanager
-def db_cursor():
-    conn = get_conn()
-    try:
-        with conn.cursor() as cur:
-            yield cur
-            conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        put_conn(conn)
+from datetime import datetime, timezone
+from utils.log_writer import writer
 
 
 # --------------------------------------------------
@@ -35,36 +18,25 @@ def log_inference(
         confidence: float,
         probabilities: dict | list | None,
         model_version: str,
-):
+) -> bool:
     """
     Универсальное логирование инференса для любых ML-задач.
+
+    Строка уходит в фоновый InferenceLogWriter (utils/log_writer.py) и
+    пишется в БД пачкой, без round trip к БД в обработчике клика.
+    created_at фиксируется здесь, а не в момент записи пачки.
+    Возвращает False, если очередь переполнена и строка отброшена.
     """
 
-    with db_cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO ml.inference_logs (
-                user_id,
-                username,
-                task,
-                input_text,
-                input_meta,
-                predicted_label,
-                confidence,
-                probabilities,
-                model_version
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                user_id,
-                username,
-                task,
-                input_payload,
-                json.dumps(input_meta) if input_meta else None,
-                predicted_label,
-                float(confidence),
-                json.dumps(probabilities) if probabilities else None,
-                model_version,
-            ),
-        )
+    return writer.submit((
+        datetime.now(timezone.utc),
+        user_id,
+        username,
+        task,
+        input_payload,
+        json.dumps(input_meta) if input_meta else None,
+        predicted_label,
+        float(confidence),
+        json.dumps(probabilities) if probabilities else None,
+        model_version,
+    ))
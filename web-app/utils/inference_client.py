@@ -0,0 +1,243 @@
+# utils/inference_client.py
+import os
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+API_BASE = os.getenv("INFERENCE_API_URL", "http://localhost:8000").rstrip("/")
+# Общий бюджет на вызов, включая повторы и паузы между ними
+API_TIMEOUT_S = float(os.getenv("INFERENCE_API_TIMEOUT_S", "5"))
+API_CONNECT_TIMEOUT_S = float(os.getenv("INFERENCE_API_CONNECT_TIMEOUT_S", "1"))
+API_RETRIES = int(os.getenv("INFERENCE_API_RETRIES", "2"))
+API_POOL_SIZE = int(os.getenv("INFERENCE_API_POOL_SIZE", "10"))
+# Сколько секунд результат проверки /ready считается актуальным
+API_HEALTH_TTL_S = float(os.getenv("INFERENCE_API_HEALTH_TTL_S", "10"))
+
+RETRY_STATUSES = {429, 502, 503, 504}
+BACKOFF_S = 0.1
+
+
+class InferenceError(RuntimeError):
+    """Inference backend не ответил успешно в пределах бюджета."""
+
+
+def _to_uint8_bytes(imgs_28):
+    # packed N x 784 uint8, decoded on the server with np.frombuffer;
+    # uint8 arrays and raw uint8 vec blobs are joined as buffers, without
+    # an intermediate tobytes() copy
+    return b"".join(
+        img if isinstance(img, (bytes, bytearray, memoryview))
+        else memoryview(np.ascontiguousarray(img, dtype=np.uint8)).cast("B")
+        for img in imgs_28
+    )
+
+
+# --------------------------------------------------
+# Client
+# --------------------------------------------------
+class InferenceClient:
+    """
+    Клиент FastAPI-инференса, общий для всех сессий Streamlit.
+
+    Один requests.Session с пулом keep-alive соединений (HTTPAdapter),
+    поэтому клик не платит за новый TCP handshake. Статус /ready
+    кэшируется на health_ttl_s и обновляется успешными/неуспешными
+    вызовами predict. Повторы (соединение, 429/502/503/504) идут с
+    экспоненциальной паузой и укладываются в общий timeout_s на вызов.
+    """
+
+    def __init__(
+            self,
+            base_url=API_BASE,
+            timeout_s=API_TIMEOUT_S,
+            connect_timeout_s=API_CONNECT_TIMEOUT_S,
+            retries=API_RETRIES,
+            pool_size=API_POOL_SIZE,
+            health_ttl_s=API_HEALTH_TTL_S,
+    ):
+        self.base_url = base_url
+        self.timeout_s = float(timeout_s)
+        self.connect_timeout_s = float(connect_timeout_s)
+        self.retries = max(0, int(retries))
+        self.health_ttl_s = float(health_ttl_s)
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, int(pool_size)))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._healthy = None
+        self._health_checked_at = 0.0
+        self._default_version = None
+        self._default_checked_at = 0.0
+
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+        self.health_checks = 0
+        self.health_cache_hits = 0
+        self.total_ms = 0.0
+
+    def _set_health(self, healthy):
+        with self._lock:
+            self._healthy = healthy
+            self._health_checked_at = time.monotonic()
+
+    def _request(self, method, path, timeout_s=None, **kwargs):
+        """HTTP-вызов с повторами в пределах общего бюджета timeout_s."""
+        budget = self.timeout_s if timeout_s is None else timeout_s
+        started = time.monotonic()
+        deadline = started + budget
+        error = None
+
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                r = self._session.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    timeout=(min(self.connect_timeout_s, remaining), remaining),
+                    **kwargs,
+                )
+            except requests.exceptions.RequestException as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                delay = BACKOFF_S * 2 ** attempt
+            else:
+                if r.status_code not in RETRY_STATUSES:
+                    with self._lock:
+                        self.calls += 1
+                        self.retried += attempt
+                        self.total_ms += (time.monotonic() - started) * 1000.0
+                    return r
+                error = f"HTTP {r.status_code}"
+                delay = BACKOFF_S * 2 ** attempt
+                retry_after = r.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+
+            if attempt == self.retries or time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+
+        with self._lock:
+            self.calls += 1
+            self.failed += 1
+            self.retried += attempt
+            self.total_ms += (time.monotonic() - started) * 1000.0
+        raise InferenceError(f"{method} {path} failed within {budget:.1f}s: {error}")
+
+    # --------------------------------------------------
+    # Health
+    # --------------------------------------------------
+    def is_healthy(self):
+        """Готов ли backend; не чаще одного запроса за health_ttl_s."""
+        with self._lock:
+            if (
+                    self._healthy is not None
+                    and time.monotonic() - self._health_checked_at < self.health_ttl_s
+            ):
+                self.health_cache_hits += 1
+                return self._healthy
+            self.health_checks += 1
+        try:
+            # /ready, а не /health: 503, пока модель не загружена и не прогрета
+            r = self._session.get(
+                f"{self.base_url}/ready",
+                timeout=(self.connect_timeout_s, 2),
+            )
+            healthy = r.status_code == 200
+        except requests.exceptions.RequestException:
+            healthy = False
+        self._set_health(healthy)
+        return healthy
+
+    def default_version(self):
+        """Версия модели по умолчанию (GET /mnist/models), кэш на health_ttl_s."""
+        with self._lock:
+            if (
+                    self._default_version is not None
+                    and time.monotonic() - self._default_checked_at < self.health_ttl_s
+            ):
+                return self._default_version
+        r = self._request("GET", "/mnist/models")
+        if r.status_code != 200:
+            raise InferenceError(f"GET /mnist/models: HTTP {r.status_code}")
+        version = r.json()["default_version"]
+        with self._lock:
+            self._default_version = version
+            self._default_checked_at = time.monotonic()
+        return version
+
+    # --------------------------------------------------
+    # MNIST
+    # --------------------------------------------------
+    def _post_images(self, path, imgs_28, timeout_s=None, version=None, params=None):
+        params = dict(params or {})
+        if version:
+            params["version"] = version
+        try:
+            r = self._request(
+                "POST",
+                path,
+                timeout_s=timeout_s,
+                params=params or None,
+                data=_to_uint8_bytes(imgs_28),
+                headers={"Content-Type": "application/octet-stream"},
+            )
+        except InferenceError:
+            self._set_health(False)
+            raise
+        if r.status_code != 200:
+            raise InferenceError(f"POST {path}: HTTP {r.status_code} {r.text[:200]}")
+        self._set_health(True)
+        return r.json()
+
+    def predict(self, img_28, timeout_s=None, version=None):
+        """
+        (pred, {digit: prob}, model_version) для одного изображения 28x28:
+        PIL, uint8 ndarray или 784 байта uint8. version=None — версия по умолчанию.
+        """
+        data = self._post_images("/mnist/predict?format=compact", [img_28], timeout_s, version)
+        pred = int(data["predicted_label"])
+        probs = dict(enumerate(data["probabilities"]))
+        return pred, probs, data["model_version"]
+
+    def predict_batch(self, imgs_28, timeout_s=None, version=None, use_cache=True):
+        """
+        Список (pred, {digit: prob}, model_version), один запрос на пачку.
+        use_cache=False — мимо кэша предсказаний API (массовые прогоны).
+        """
+        data = self._post_images(
+            "/mnist/predict_batch", imgs_28, timeout_s, version,
+            params=None if use_cache else {"cache": "false"},
+        )
+        return [
+            (int(pred), dict(enumerate(probs)), data["model_version"])
+            for pred, probs in zip(data["predicted_labels"], data["probabilities"])
+        ]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "base_url": self.base_url,
+                "healthy": self._healthy,
+                "calls": self.calls,
+                "retried": self.retried,
+                "failed": self.failed,
+                "mean_ms": (self.total_ms / self.calls) if self.calls else 0.0,
+                "health_checks": self.health_checks,
+                "health_cache_hits": self.health_cache_hits,
+            }
+
+
+# Один клиент (и пул соединений) на процесс Streamlit
+client = InferenceClient()
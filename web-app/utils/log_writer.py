@@ -0,0 +1,230 @@
+# utils/log_writer.py
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+from utils.db import get_conn, put_conn
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+LOG_QUEUE_MAX = int(os.getenv("INFERENCE_LOG_QUEUE_MAX", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("INFERENCE_LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL_S = float(os.getenv("INFERENCE_LOG_FLUSH_INTERVAL_S", "1.0"))
+# Сколько submit() ждёт места в заполненной очереди, прежде чем отбросить строку
+LOG_ENQUEUE_TIMEOUT_S = float(os.getenv("INFERENCE_LOG_ENQUEUE_TIMEOUT_S", "0.05"))
+LOG_FLUSH_RETRIES = 3
+
+INSERT_SQL = """
+    INSERT INTO ml.inference_logs (
+        created_at,
+        user_id,
+        username,
+        task,
+        input_text,
+        input_meta,
+        predicted_label,
+        confidence,
+        probabilities,
+        model_version
+    )
+    VALUES %s
+"""
+
+_STOP = object()
+
+
+# --------------------------------------------------
+# Background writer
+# --------------------------------------------------
+class InferenceLogWriter:
+    """
+    Фоновая запись логов инференса пачками.
+
+    submit() только кладёт строку в ограниченную очередь; поток-писатель
+    забирает до batch_size строк (или всё, что накопилось за
+    flush_interval_s) и пишет их одним INSERT ... VALUES через
+    execute_values. При переполнении очереди submit() ждёт
+    enqueue_timeout_s и затем отбрасывает строку (счётчик dropped),
+    а не блокирует UI.
+    """
+
+    def __init__(
+            self,
+            max_queue=LOG_QUEUE_MAX,
+            batch_size=LOG_BATCH_SIZE,
+            flush_interval_s=LOG_FLUSH_INTERVAL_S,
+            enqueue_timeout_s=LOG_ENQUEUE_TIMEOUT_S,
+    ):
+        self.max_queue = max(1, int(max_queue))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = float(flush_interval_s)
+        self.enqueue_timeout_s = float(enqueue_timeout_s)
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.blocked = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+        self.last_error = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="inference-log-writer", daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, row) -> bool:
+        """Поставить строку в очередь; False, если она отброшена."""
+        if self._closed:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.blocked += 1
+            try:
+                self._queue.put(row, timeout=self.enqueue_timeout_s)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                return False
+        with self._lock:
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    # --------------------------------------------------
+    # Worker
+    # --------------------------------------------------
+    def _next_batch(self):
+        """До batch_size строк; ждёт не дольше flush_interval_s после первой."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                self._flush(batch)
+            if stop:
+                # Дописать то, что успели положить до close()
+                rest = []
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        rest.append(item)
+                for i in range(0, len(rest), self.batch_size):
+                    self._flush(rest[i:i + self.batch_size])
+                return
+
+    def _flush(self, rows):
+        started = time.perf_counter()
+        for attempt in range(1, LOG_FLUSH_RETRIES + 1):
+            try:
+                self._insert(rows)
+                break
+            except Exception as exc:
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                logger.warning(
+                    "inference log flush failed (attempt %d/%d): %s",
+                    attempt, LOG_FLUSH_RETRIES, exc,
+                )
+            if attempt == LOG_FLUSH_RETRIES:
+                with self._lock:
+                    self.failed += len(rows)
+                return
+            time.sleep(0.2 * attempt)
+
+        with self._lock:
+            self.written += len(rows)
+            self.flushes += 1
+            self.last_flush_ms = (time.perf_counter() - started) * 1000.0
+
+    @staticmethod
+    def _insert(rows):
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, INSERT_SQL, rows, page_size=len(rows))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            put_conn(conn)
+
+    # --------------------------------------------------
+    # Shutdown / metrics
+    # --------------------------------------------------
+    def close(self, timeout=10.0):
+        """Дописать очередь в БД и остановить поток."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        # put() в обход лимита очереди: _STOP не должен теряться
+        with self._queue.mutex:
+            self._queue.queue.append(_STOP)
+            self._queue.unfinished_tasks += 1
+            self._queue.not_empty.notify()
+        self._thread.join(timeout)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "max_depth": self.max_depth,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "blocked": self.blocked,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "mean_batch": (self.written / self.flushes) if self.flushes else 0.0,
+                "last_flush_ms": self.last_flush_ms,
+                "last_error": self.last_error,
+            }
+
+
+# Один писатель на процесс Streamlit (общий для всех сессий)
+writer = InferenceLogWriter()
+atexit.register(writer.close)
@@ -0,0 +1,153 @@
+# utils/mnist_samples.py
+import logging
+
+import numpy as np
+
+from utils.db import get_conn, put_conn
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# Sampling index
+# --------------------------------------------------
+# demo.mnist_sample_index нумерует примеры каждой пары (split, label)
+# плотно 0..n-1 в случайном порядке. Случайная выборка — это случайный
+# старт + K подряд идущих позиций: K точечных lookup'ов по PK вместо
+# ORDER BY random() по всем строкам метки.
+REBUILD_INDEX_SQL = [
+    "TRUNCATE demo.mnist_sample_index",
+    """
+    INSERT INTO demo.mnist_sample_index (split, label, pos, sample_id)
+    SELECT
+        split,
+        label,
+        row_number() OVER (PARTITION BY split, label ORDER BY random()) - 1,
+        id
+    FROM demo.mnist_samples
+    """,
+    "ANALYZE demo.mnist_sample_index",
+]
+
+# Один round trip на все метки. n берётся как max(pos) + 1 (по PK, без
+# count(*)), старт выбирается один раз на метку (OFFSET 0 не даёт
+# планировщику подтянуть random() в join), позиции (start + i) % n
+# различны, поэтому K примеров внутри метки не повторяются.
+SAMPLE_SQL = """
+    SELECT d.label, s.vec, s.rows, s.cols, s.dtype, s.id
+    FROM unnest(%(labels)s::int[]) AS d(label)
+    CROSS JOIN LATERAL (
+        SELECT c.n, floor(random() * c.n)::int AS start
+        FROM (
+            SELECT max(pos) + 1 AS n
+            FROM demo.mnist_sample_index
+            WHERE split = %(split)s AND label = d.label
+        ) c
+        OFFSET 0
+    ) r
+    CROSS JOIN LATERAL generate_series(0, %(k)s - 1) AS g(i)
+    JOIN demo.mnist_sample_index ix
+        ON ix.split = %(split)s
+        AND ix.label = d.label
+        AND ix.pos = (r.start + g.i) %% r.n
+    JOIN demo.mnist_samples s ON s.id = ix.sample_id
+    WHERE g.i < r.n
+    ORDER BY d.label, g.i
+"""
+
+# Пока индекс не построен (build_mnist_db.py): тот же результат одним
+# запросом, но с сортировкой
+FALLBACK_SQL = """
+    SELECT label, vec, rows, cols, dtype, id
+    FROM (
+        SELECT
+            label, vec, rows, cols, dtype, id,
+            row_number() OVER (PARTITION BY label ORDER BY random()) AS rn
+        FROM demo.mnist_samples
+        WHERE split = %(split)s AND label = ANY(%(labels)s)
+    ) t
+    WHERE rn <= %(k)s
+    ORDER BY label
+"""
+
+
+def decode_vec(vec, rows, cols, dtype="float32"):
+    """
+    vec из demo.mnist_samples -> uint8 (rows, cols) для модели и st.image.
+
+    'uint8' — view на буфер, который вернул psycopg2, без копирования;
+    'float32' (старые строки, [0..1]) пересчитывается в 0..255.
+    """
+    if dtype == "uint8":
+        return np.frombuffer(vec, dtype=np.uint8).reshape(rows, cols)
+    arr = np.frombuffer(vec, dtype=np.float32).reshape(rows, cols)
+    # rint, а не усечение: float32 x/255 * 255 может дать 254.99998
+    return np.rint(arr * 255.0).clip(0, 255).astype(np.uint8)
+
+
+def rebuild_sample_index(cur):
+    """
+    Перестроить demo.mnist_sample_index по demo.mnist_samples.
+    Вызывается после загрузки данных (build_mnist_db.py).
+    """
+    for stmt in REBUILD_INDEX_SQL:
+        cur.execute(stmt)
+
+
+def sample_per_label(k=1, split="test", labels=range(10)):
+    """
+    Случайные примеры MNIST: до k различных на каждую метку, один запрос.
+
+    Returns:
+        dict: label -> [(label, vec, rows, cols, dtype, sample_id), ...];
+        метки без примеров отсутствуют. vec декодируется через decode_vec.
+    """
+    params = {"labels": [int(x) for x in labels], "split": split, "k": int(k)}
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SAMPLE_SQL, params)
+            rows = cur.fetchall()
+            if not rows:
+                logger.warning("demo.mnist_sample_index is empty, sampling with ORDER BY random()")
+                cur.execute(FALLBACK_SQL, params)
+                rows = cur.fetchall()
+    finally:
+        put_conn(conn)
+
+    samples = {}
+    for row in rows:
+        samples.setdefault(row[0], []).append(row)
+    return samples
+
+
+# --------------------------------------------------
+# Precomputed predictions (ml.mnist_predictions)
+# --------------------------------------------------
+def precomputed_predictions(sample_ids, model_version):
+    """
+    Готовые ответы модели из ml.mnist_predictions (db/score_mnist.py).
+
+    Returns:
+        dict: sample_id -> (pred, {digit: prob}, model_version) — тот же
+        вид, что у InferenceClient.predict; id без предрасчёта отсутствуют.
+    """
+    if not sample_ids or not model_version:
+        return {}
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT sample_id, predicted_label, probabilities
+                FROM ml.mnist_predictions
+                WHERE model_version = %s AND sample_id = ANY(%s)
+                """,
+                (model_version, [int(i) for i in sample_ids]),
+            )
+            rows = cur.fetchall()
+    finally:
+        put_conn(conn)
+    return {
+        sample_id: (int(pred), dict(enumerate(probs)), model_version)
+        for sample_id, pred, probs in rows
+    }
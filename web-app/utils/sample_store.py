@@ -0,0 +1,221 @@
+# utils/sample_store.py
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from utils.db import get_conn, put_conn
+from utils.mnist_samples import decode_vec
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+SAMPLE_STORE_DIR = Path(os.getenv("MNIST_SAMPLE_STORE_DIR", "mnist_store"))
+# Как часто страница заново открывает хранилище и сверяет его с БД
+SAMPLE_STORE_CHECK_S = float(os.getenv("MNIST_SAMPLE_STORE_CHECK_S", "300"))
+EXPORT_FETCH_SIZE = 2000
+
+# Отпечаток split в БД: после перезагрузки build_mnist_db.py id строк
+# другие (BIGSERIAL не переиспользуется), и хранилище надо выгрузить заново
+SOURCE_SQL = """
+    SELECT count(*), min(id), max(id)
+    FROM demo.mnist_samples
+    WHERE split = %s
+"""
+
+
+def _fingerprint(cur, split):
+    cur.execute(SOURCE_SQL, (split,))
+    n, min_id, max_id = cur.fetchone()
+    return {"n": int(n), "min_id": min_id, "max_id": max_id}
+
+
+def source_fingerprint(split="test"):
+    """{n, min_id, max_id} строк split в demo.mnist_samples."""
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            return _fingerprint(cur, split)
+    finally:
+        conn.rollback()
+        put_conn(conn)
+
+
+# --------------------------------------------------
+# Export (PostgreSQL -> .npy)
+# --------------------------------------------------
+def export_store(split="test", root=SAMPLE_STORE_DIR):
+    """
+    Разовый экспорт demo.mnist_samples[split] в root/<split>/:
+
+    - images.npy  — uint8 (n, 28, 28), строки отсортированы по метке
+    - offsets.npy — int64 (11,), примеры метки d: images[offsets[d]:offsets[d+1]]
+    - ids.npy     — int64 (n,), id строк в demo.mnist_samples
+    - meta.json   — split, n, отпечаток источника (source), время экспорта
+
+    Пишется во временный каталог и переименовывается целиком, поэтому
+    читатели никогда не видят наполовину записанное хранилище.
+    БД остаётся источником истины: повторный экспорт просто заменяет файлы.
+    """
+    root = Path(root)
+    final_dir = root / split
+    tmp_dir = root / f".{split}.tmp-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            source = _fingerprint(cur, split)
+            cur.execute(
+                "SELECT label, count(*) FROM demo.mnist_samples WHERE split = %s GROUP BY label",
+                (split,),
+            )
+            counts = dict(cur.fetchall())
+        n = sum(counts.values())
+        if n == 0:
+            raise RuntimeError(f"demo.mnist_samples has no rows for split={split!r}")
+
+        images = np.lib.format.open_memmap(tmp_dir / "images.npy", mode="w+", dtype=np.uint8, shape=(n, 28, 28))
+        ids = np.empty(n, dtype=np.int64)
+        labels = np.empty(n, dtype=np.int64)
+
+        # серверный курсор: 70k BYTEA не держим в памяти клиента целиком
+        with conn.cursor(name="mnist_store_export") as cur:
+            cur.itersize = EXPORT_FETCH_SIZE
+            cur.execute(
+                """
+                SELECT id, label, vec, rows, cols, dtype
+                FROM demo.mnist_samples
+                WHERE split = %s
+                ORDER BY label, id
+                """,
+                (split,),
+            )
+            i = 0
+            for sample_id, label, vec, rows, cols, dtype in cur:
+                images[i] = decode_vec(vec, rows, cols, dtype)
+                ids[i] = sample_id
+                labels[i] = label
+                i += 1
+        conn.rollback()
+    finally:
+        put_conn(conn)
+
+    if i != n:
+        raise RuntimeError(f"demo.mnist_samples changed during export ({i} rows, expected {n})")
+
+    images.flush()
+    del images
+    offsets = np.searchsorted(labels, np.arange(11), side="left").astype(np.int64)
+    np.save(tmp_dir / "offsets.npy", offsets)
+    np.save(tmp_dir / "ids.npy", ids)
+    (tmp_dir / "meta.json").write_text(json.dumps({
+        "split": split,
+        "n": int(n),
+        "source": source,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }))
+
+    old_dir = root / f".{split}.old-{os.getpid()}-{threading.get_ident()}"
+    if final_dir.exists():
+        final_dir.rename(old_dir)
+    tmp_dir.rename(final_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logger.info("exported %d %s samples to %s", n, split, final_dir)
+    return final_dir
+
+
+# --------------------------------------------------
+# Store
+# --------------------------------------------------
+class SampleStore:
+    """
+    Локальное хранилище примеров MNIST поверх memory-mapped images.npy.
+
+    Страницы процесса (и все процессы на машине) делят одни и те же
+    страницы файла через page cache; случайная выборка — чистый numpy
+    без обращения к БД, PNG-миниатюры кодируются один раз на пример.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.images = np.load(self.path / "images.npy", mmap_mode="r")
+        self.offsets = np.load(self.path / "offsets.npy")
+        self.ids = np.load(self.path / "ids.npy", mmap_mode="r")
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        self._thumbs = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, split="test", root=SAMPLE_STORE_DIR):
+        """
+        Открыть хранилище; при первом запуске или если split в БД
+        изменился с момента экспорта (другой отпечаток) — выгрузить заново.
+        """
+        path = Path(root) / split
+        meta_path = path / "meta.json"
+        if not meta_path.exists():
+            export_store(split, root)
+            return cls(path)
+
+        stored = json.loads(meta_path.read_text()).get("source")
+        try:
+            current = source_fingerprint(split)
+        except Exception:
+            # БД недоступна: отдаём то, что есть, сверка — при следующем open
+            logger.warning("cannot check MNIST sample store %s against the database", path, exc_info=True)
+            return cls(path)
+        if stored != current:
+            logger.info("MNIST sample store %s is stale (%s != %s), re-exporting", path, stored, current)
+            export_store(split, root)
+        return cls(path)
+
+    def __len__(self):
+        return len(self.images)
+
+    def sample(self, k=1, labels=range(10), rng=None):
+        """label -> до k различных индексов примеров этой метки."""
+        rng = np.random.default_rng() if rng is None else rng
+        picks = {}
+        for d in labels:
+            start, stop = int(self.offsets[d]), int(self.offsets[d + 1])
+            if stop > start:
+                n = min(int(k), stop - start)
+                picks[d] = (start + rng.choice(stop - start, size=n, replace=False)).tolist()
+        return picks
+
+    def image(self, i):
+        """uint8 (28, 28), view на memmap без копирования."""
+        return self.images[i]
+
+    def thumbnail(self, i):
+        """PNG-байты примера i (кэш на процесс, подходят для st.image)."""
+        png = self._thumbs.get(i)
+        if png is None:
+            buf = io.BytesIO()
+            Image.fromarray(np.asarray(self.images[i])).save(buf, format="PNG")
+            png = buf.getvalue()
+            with self._lock:
+                self._thumbs[i] = png
+        return png
+
+
+# --------------------------------------------------
+# Entry point: python -m utils.sample_store [split ...]
+# --------------------------------------------------
+if __name__ == "__main__":
+    import sys
+
+    for split in sys.argv[1:] or ["test"]:
+        out = export_store(split)
+        print(f"✅ {split}: {len(SampleStore(out))} примеров → {out}")